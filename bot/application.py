@@ -1,18 +1,34 @@
 # bot/application.py
 import logging
 from telegram.ext import Application, ApplicationBuilder
-from telegram.request import HTTPXRequest
 from core.settings import settings
+from bot.update_processor import PerUserUpdateProcessor
+from bot.request import build_requests, bot_api_options
+from core.rate_limiter import rate_limiter
 
 def create_application() -> Application:
     """اپلیکیشن ربات را با تنظیمات اولیه می‌سازد."""
     
-    request = HTTPXRequest(connect_timeout=30.0, read_timeout=60.0)
+    # استخرهای اتصال جدا برای getUpdates، درخواست‌های کوچک و آپلود فایل‌ها
+    request, updates_request = build_requests()
     
-    application = (
+    builder = (
         ApplicationBuilder()
         .token(settings.BOT_TOKEN)
         .request(request)
-        .build()
+        .get_updates_request(updates_request)
+        # پردازش همزمان آپدیت‌ها؛ آپدیت‌های هر کاربر همچنان به ترتیب اجرا می‌شوند
+        .concurrent_updates(PerUserUpdateProcessor(settings.MAX_CONCURRENT_UPDATES, settings.MAX_PENDING_UPDATES))
+        # محدودیت نرخ ارسال (سراسری و هر چت) با اولویت پاسخ‌ها بر ویرایش‌های پیشرفت و ارسال همگانی
+        .rate_limiter(rate_limiter)
     )
-    return application
\ No newline at end of file
+
+    # اتصال به سرور Bot API خودمیزبان (آپلود تا 2000 مگابایت و آپلود با مسیر فایل)
+    api_options = bot_api_options()
+    if api_options:
+        builder = builder.base_url(api_options['base_url']).local_mode(api_options['local_mode'])
+        if 'base_file_url' in api_options:
+            builder = builder.base_file_url(api_options['base_file_url'])
+        logging.getLogger(__name__).info(f"Using Bot API server at {api_options['base_url']} (local mode: {api_options['local_mode']}).")
+
+    return builder.build()
\ No newline at end of file
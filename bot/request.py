@@ -0,0 +1,80 @@
+# bot/request.py
+
+from typing import Optional
+
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from core.settings import settings
+
+class RoutingRequest(BaseRequest):
+    """
+    درخواست‌های Bot API را بین دو استخر اتصال جدا تقسیم می‌کند: درخواست‌هایی که فایل آپلود
+    می‌کنند (send_video، send_audio و ...) به استخر media با timeout طولانی می‌روند و بقیه
+    (ویرایش پیام‌های پیشرفت، answer و ...) به استخر control، تا آپلودهای طولانی اتصال‌های
+    درخواست‌های تعاملی را اشغال نکنند.
+    """
+    def __init__(self, control: BaseRequest, media: BaseRequest):
+        self._control = control
+        self._media = media
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._control.read_timeout
+
+    async def initialize(self) -> None:
+        await self._control.initialize()
+        await self._media.initialize()
+
+    async def shutdown(self) -> None:
+        await self._control.shutdown()
+        await self._media.shutdown()
+
+    async def do_request(self, url, method, request_data: Optional[RequestData] = None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE):
+        target = self._media if request_data is not None and request_data.contains_files else self._control
+        # timeout های پیش‌فرض (DEFAULT_NONE) توسط همان استخر انتخاب شده تعیین می‌شوند
+        return await target.do_request(
+            url, method, request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+            connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+        )
+
+def bot_api_options() -> dict:
+    """آدرس سرور Bot API خودمیزبان و حالت local (در صورت تنظیم) برای ساخت Bot."""
+    if not settings.TELEGRAM_API_BASE_URL:
+        return {}
+    options = {'base_url': settings.TELEGRAM_API_BASE_URL, 'local_mode': settings.TELEGRAM_LOCAL_MODE}
+    if settings.TELEGRAM_API_BASE_FILE_URL:
+        options['base_file_url'] = settings.TELEGRAM_API_BASE_FILE_URL
+    return options
+
+def build_requests() -> tuple[BaseRequest, HTTPXRequest]:
+    """درخواست‌دهنده اصلی ربات (control + media) و درخواست‌دهنده جداگانه getUpdates را می‌سازد."""
+    control = HTTPXRequest(
+        connection_pool_size=settings.TG_CONTROL_POOL_SIZE,
+        connect_timeout=settings.TG_CONNECT_TIMEOUT,
+        read_timeout=settings.TG_CONTROL_READ_TIMEOUT,
+        write_timeout=settings.TG_CONTROL_READ_TIMEOUT,
+        pool_timeout=settings.TG_POOL_TIMEOUT,
+        http_version=settings.TG_HTTP_VERSION,
+    )
+    media = HTTPXRequest(
+        connection_pool_size=settings.TG_MEDIA_POOL_SIZE,
+        connect_timeout=settings.TG_CONNECT_TIMEOUT,
+        read_timeout=settings.TG_MEDIA_READ_TIMEOUT,
+        write_timeout=settings.TG_MEDIA_WRITE_TIMEOUT,
+        # برای درخواست‌های دارای فایل، PTB به جای write_timeout از media_write_timeout (پیش‌فرض 20 ثانیه) استفاده می‌کند
+        media_write_timeout=settings.TG_MEDIA_WRITE_TIMEOUT,
+        # آپلودها ممکن است برای گرفتن اتصال آزاد مدتی منتظر بمانند
+        pool_timeout=settings.TG_MEDIA_READ_TIMEOUT,
+        http_version=settings.TG_HTTP_VERSION,
+    )
+    # long polling فقط یک اتصال نیاز دارد و read_timeout آن باید از timeout خود getUpdates بیشتر باشد
+    updates = HTTPXRequest(
+        connection_pool_size=1,
+        connect_timeout=settings.TG_CONNECT_TIMEOUT,
+        read_timeout=settings.TG_UPDATES_READ_TIMEOUT,
+        pool_timeout=settings.TG_POOL_TIMEOUT,
+        http_version=settings.TG_HTTP_VERSION,
+    )
+    return RoutingRequest(control, media), updates
@@ -0,0 +1,47 @@
+# bot/update_processor.py
+
+import asyncio
+import weakref
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    آپدیت‌ها را به صورت همزمان (حداکثر max_concurrent_updates) پردازش می‌کند، اما آپدیت‌های
+    یک کاربر به ترتیب دریافت و یکی پس از دیگری اجرا می‌شوند تا callback های او جابجا نشوند.
+    semaphore خود PTB تعداد کل آپدیت‌های در حال اجرا یا منتظر قفل کاربر (max_pending_updates)
+    را محدود می‌کند و semaphore جداگانه _running فقط پس از گرفتن قفل کاربر گرفته می‌شود تا
+    آپدیت‌های منتظر یک کاربر، ظرفیت اجرای بقیه کاربران را اشغال نکنند.
+    """
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int | None = None):
+        super().__init__(max(max_pending_updates or 0, max_concurrent_updates))
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        # قفل هر کاربر تا زمانی که آپدیتی از او در حال اجرا یا انتظار است نگه داشته می‌شود
+        self._user_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _user_lock(self, update: object) -> asyncio.Lock | None:
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            return None
+        lock = self._user_locks.get(user.id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user.id] = lock
+        return lock
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        lock = self._user_lock(update)
+        if lock is None:
+            async with self._running:
+                await coroutine
+            return
+        async with lock, self._running:
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,100 @@
+# bot/webhook.py
+"""
+دریافت آپدیت‌ها با webhook روی یک سرور aiohttp داخلی و توزیع آن‌ها بین replica ها.
+هر آپدیت بر اساس شناسه کاربر همیشه به یک replica ثابت (user_id % BOT_REPLICAS) می‌رسد تا
+وضعیت و ترتیب درخواست‌های هر کاربر در یک پردازه باقی بماند.
+"""
+import json
+import asyncio
+import logging
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from core.settings import settings
+from core.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# مدت انتظار هر replica برای آپدیت جدید از صف (ثانیه)
+POP_TIMEOUT = 5
+
+def update_user_id(data: dict) -> int | None:
+    """شناسه کاربر (یا در نبود آن، چت) فرستنده را از آپدیت خام استخراج می‌کند."""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        sender = value.get('from') or value.get('user')
+        if isinstance(sender, dict) and 'id' in sender:
+            return sender['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+def shard_for(data: dict, replicas: int) -> int:
+    user_id = update_user_id(data)
+    return abs(user_id) % replicas if user_id is not None else 0
+
+async def route_update(application: Application, data: dict):
+    """آپدیت را در همین پردازه پردازش می‌کند یا به صف replica مربوطه می‌فرستد."""
+    if settings.BOT_REPLICAS <= 1:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return
+    await shared_state.push_update(shard_for(data, settings.BOT_REPLICAS), json.dumps(data))
+
+async def consume_updates(application: Application, shard: int):
+    """آپدیت‌های shard این replica را از صف مشترک خوانده و به اپلیکیشن می‌دهد."""
+    logger.info(f"Consuming updates for shard {shard}/{settings.BOT_REPLICAS}.")
+    while True:
+        try:
+            payload = await shared_state.pop_update(shard, POP_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Could not read updates for shard {shard}: {e}")
+            await asyncio.sleep(POP_TIMEOUT)
+            continue
+        if payload:
+            await application.update_queue.put(Update.de_json(json.loads(payload), application.bot))
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text='ok')
+
+def _webhook_handler(application: Application):
+    async def handle(request: web.Request) -> web.Response:
+        if request.headers.get(SECRET_HEADER) != settings.WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            await route_update(application, data)
+        except Exception as e:
+            # پاسخ غیر 200 باعث می‌شود تلگرام آپدیت را دوباره ارسال کند
+            logger.error(f"Could not route update {data.get('update_id')}: {e}")
+            return web.Response(status=503)
+        return web.Response()
+    return handle
+
+async def start_webhook_server(application: Application) -> web.AppRunner:
+    """سرور webhook را روی حلقه رویداد فعلی اجرا کرده و آدرس آن را در تلگرام ثبت می‌کند."""
+    if not settings.WEBHOOK_URL:
+        raise ValueError("BOT_MODE=webhook نیاز به تنظیم WEBHOOK_URL (آدرس عمومی HTTPS ربات) دارد.")
+    app = web.Application()
+    app.router.add_post(f"/{settings.WEBHOOK_PATH}", _webhook_handler(application))
+    app.router.add_get('/healthz', _healthz)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, settings.WEBHOOK_LISTEN, settings.WEBHOOK_PORT).start()
+
+    webhook_url = f"{settings.WEBHOOK_URL.rstrip('/')}/{settings.WEBHOOK_PATH}"
+    await application.bot.set_webhook(
+        url=webhook_url, secret_token=settings.WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES, max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+    )
+    logger.info(f"Webhook server listening on {settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}, "
+                f"registered at {webhook_url} ({settings.BOT_REPLICAS} replica(s)).")
+    return runner
@@ -1,10 +1,18 @@
 # config.py
 
+import json
+import time
 import random
 import logging
 import asyncio
+import datetime
+from typing import AsyncIterable, AsyncIterator, Awaitable, Collection, TypeVar
 import aiohttp
+from sqlalchemy import select, delete
 from core.settings import settings
+from core.proxy_pool import proxy_pool, ProxyStats
+from database.database import AsyncSessionLocal
+from database.models import ProxyHealth
 
 logger = logging.getLogger(__name__)
 
@@ -17,48 +25,137 @@ PROXY_SOURCES = [
 ]
 
 RAW_PROXIES: set[str] = set() # استفاده از set برای حذف خودکار موارد تکراری
-VALIDATED_PROXIES: list[str] = []
+# پراکسی‌های معتبر به همراه تاخیر و سابقه آن‌ها در core/proxy_pool.py نگهداری می‌شوند
 VALIDATION_LOCK = asyncio.Lock()
+# فقط یک پردازه (نمونه اصلی ربات) منابع را اسکن کرده و سلامت پراکسی‌ها را در دیتابیس ذخیره می‌کند؛
+# replica ها و worker های Celery این مقدار را False کرده و نسخه ذخیره شده را دوره‌ای بارگذاری می‌کنند
+MAINTAIN_PROXIES = True
 
 # --- تنظیمات قابل تغییر برای بهینه‌سازی ---
 TEST_URL = 'https://api.google.com'
 MAX_CONCURRENT_TESTS = 500
 TEST_TIMEOUT = 3
 REVALIDATION_THRESHOLD = 20
-INITIAL_QUICK_TEST_COUNT = 100
+# بازبینی تدریجی: تعداد پراکسی‌هایی که در هر اجرای revalidate_proxies دوباره تست می‌شوند
+REVALIDATION_BATCH_SIZE = 25
+# پراکسی‌های ذخیره شده قدیمی‌تر از این مدت (ثانیه) در راه‌اندازی بارگذاری نمی‌شوند
+PROXY_HEALTH_MAX_AGE = 24 * 3600
+# پاسخ‌هایی از سرویس مقصد که نشان می‌دهند IP پراکسی مسدود شده است
+BLOCKED_STATUSES = {403, 407, 429}
+# منابع به صورت جریانی و با سرعت تست خوانده می‌شوند؛ فقط اتصال و هر خواندن از سوکت محدودیت زمانی دارد
+SOURCE_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=15)
 
-async def _fetch_proxies_from_url(session: aiohttp.ClientSession, url: str) -> set[str]:
-    """پراکسی‌ها را از یک URL مشخص به صورت غیرهمزمان دریافت می‌کند."""
+T = TypeVar('T')
+
+async def _stream_proxies_from_url(session: aiohttp.ClientSession, url: str) -> AsyncIterator[str]:
+    """
+    پراکسی‌های یک منبع را خط به خط و همزمان با دریافت پاسخ برمی‌گرداند تا کل لیست
+    (که ممکن است ده‌ها هزار ورودی باشد) یکجا در حافظه خوانده نشود.
+    """
     try:
-        async with session.get(url, timeout=15) as response:
-            if response.status == 200:
-                text = await response.text()
-                # پراکسی‌ها را تمیز کرده و به فرمت http://ip:port در می‌آورد
-                return {f"http://{p.strip()}" for p in text.splitlines() if p.strip()}
-            else:
+        async with session.get(url, timeout=SOURCE_TIMEOUT) as response:
+            if response.status != 200:
                 logger.warning(f"Failed to fetch proxies from {url}, status code: {response.status}")
+                return
+            async for line in response.content:
+                # پراکسی‌ها را تمیز کرده و به فرمت http://ip:port در می‌آورد
+                proxy = line.decode('utf-8', 'ignore').strip()
+                if proxy:
+                    yield f"http://{proxy}"
     except Exception as e:
         logger.error(f"Error fetching proxies from {url}: {e}")
-    return set()
 
-async def test_proxy(session: aiohttp.ClientSession, proxy: str) -> str | None:
-    """یک پراکسی را به صورت غیرهمزمان تست می‌کند."""
+async def _shuffled(items: AsyncIterable[str], buffer_size: int) -> AsyncIterator[str]:
+    """
+    ترتیب ورودی‌ها را با یک بافر محدود به هم می‌ریزد تا پراکسی‌های پشت سر هم یک منبع
+    (معمولاً از یک زیرشبکه) همزمان تست نشوند، بدون این‌که کل لیست نگه داشته شود.
+    """
+    buffer: list[str] = []
+    async for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        index = random.randrange(buffer_size)
+        buffer[index], item = item, buffer[index]
+        yield item
+    random.shuffle(buffer)
+    for item in buffer:
+        yield item
+
+async def test_proxy(session: aiohttp.ClientSession, proxy: str) -> tuple[str, float] | None:
+    """یک پراکسی را به صورت غیرهمزمان تست کرده و (پراکسی، تاخیر بر حسب ثانیه) را برمی‌گرداند."""
+    started = time.monotonic()
     try:
         async with session.get(TEST_URL, proxy=proxy, timeout=TEST_TIMEOUT) as response:
             if response.status < 500: # هر پاسخی غیر از خطای سرور به معنی کار کردن پراکسی است
-                return proxy
+                return proxy, time.monotonic() - started
     except (aiohttp.ClientError, asyncio.TimeoutError):
         pass # خطاهای معمول شبکه و تایم‌اوت را نادیده بگیر
     except Exception as e:
         logger.debug(f"Unexpected error while testing proxy {proxy}: {e}")
     return None
 
-async def update_and_test_proxies():
+def _new_test_session() -> aiohttp.ClientSession:
+    # نشست اختصاصی تست‌ها؛ تست‌های پرتعداد استخر اتصال مشترک ربات را اشغال نمی‌کنند
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_TESTS, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector)
+
+async def probe_proxy(session: aiohttp.ClientSession, proxy: str, url: str) -> bool:
+    """بررسی می‌کند که آیا پراکسی به نقطه تست یک سرویس مقصد دسترسی دارد (و مسدود نشده است)."""
+    try:
+        async with session.get(url, proxy=proxy, timeout=TEST_TIMEOUT) as response:
+            return response.status < 500 and response.status not in BLOCKED_STATUSES
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+    except Exception as e:
+        logger.debug(f"Unexpected error while probing {url} via {proxy}: {e}")
+        return False
+
+async def _test_stream(session: aiohttp.ClientSession, candidates: AsyncIterable[str]) -> int:
+    """
+    پراکسی‌ها را با تعداد ثابتی worker به صورت جریانی تست می‌کند. هر worker به محض پایان یک تست
+    سراغ پراکسی بعدی می‌رود و هر پراکسی سالم بلافاصله به استخر اضافه می‌شود؛ صف محدود باعث می‌شود
+    حافظه مصرفی به اندازه لیست ورودی وابسته نباشد. تعداد پراکسی‌های سالم را برمی‌گرداند.
+    """
+    queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=MAX_CONCURRENT_TESTS * 2)
+    found = tested = 0
+
+    async def producer():
+        try:
+            async for proxy in candidates:
+                await queue.put(proxy)
+        finally:
+            for _ in range(MAX_CONCURRENT_TESTS):
+                await queue.put(None)
+
+    async def worker():
+        nonlocal found, tested
+        while (proxy := await queue.get()) is not None:
+            res = await test_proxy(session, proxy)
+            tested += 1
+            if res:
+                proxy_pool.add(*res)
+                found += 1
+            if tested % 1000 == 0:
+                logger.debug(f"Background validation progress: tested {tested}, {found} working so far.")
+
+    await asyncio.gather(producer(), *(worker() for _ in range(MAX_CONCURRENT_TESTS)))
+    return found
+
+def _probe_targets() -> dict[str, str]:
+    """نقاط تست سرویس‌های فعالی که از پراکسی استفاده می‌کنند: نام سرویس ← PROBE_URL"""
+    from services import SERVICES
+    from core.handlers.service_manager import is_service_enabled
+    return {s.name: s.PROBE_URL for s in SERVICES if s.PROBE_URL and is_service_enabled(s.name)}
+
+async def update_and_test_proxies(full: bool = False):
     """
-    لیست پراکسی‌ها را از چندین منبع آپدیت و اعتبارسنجی می‌کند.
+    منابع پراکسی را دوباره دریافت کرده و تنها ورودی‌های جدید (که در اجرای قبلی نبوده‌اند)
+    را تست می‌کند. پراکسی‌های موجود در استخر توسط revalidate_proxies به تدریج بازبینی می‌شوند.
+    با full=True (کم شدن پراکسی‌ها) تمام ورودی‌ها دوباره تست می‌شوند.
     """
-    global RAW_PROXIES, VALIDATED_PROXIES
-    
+    global RAW_PROXIES
+
     if VALIDATION_LOCK.locked():
         logger.info("Proxy validation is already in progress. Skipping.")
         return
@@ -66,72 +163,120 @@ async def update_and_test_proxies():
     async with VALIDATION_LOCK:
         logger.info("Starting proxy update and validation process from multiple sources...")
 
-        # --- FIX: دریافت همزمان پراکسی‌ها از تمام منابع ---
-        async with aiohttp.ClientSession() as session:
-            tasks = [_fetch_proxies_from_url(session, url) for url in PROXY_SOURCES]
-            results = await asyncio.gather(*tasks)
-        
-        # ادغام تمام پراکسی‌های دریافت شده در یک مجموعه (set) برای حذف تکراری‌ها
-        RAW_PROXIES = set.union(*results)
-        
-        if not RAW_PROXIES:
-            logger.error("Could not fetch any proxies from any source. Proxy system will be inactive.")
-            VALIDATED_PROXIES = []
-            return
-            
-        logger.info(f"Fetched {len(RAW_PROXIES)} unique raw proxies from {len(PROXY_SOURCES)} sources.")
-
-        # پراکسی‌ها را به لیست تبدیل کرده و به صورت تصادفی مرتب می‌کنیم
-        proxy_list = list(RAW_PROXIES)
-        random.shuffle(proxy_list)
-
-        logger.info(f"Starting initial quick test on {INITIAL_QUICK_TEST_COUNT} random proxies...")
-        quick_test_proxies = proxy_list[:INITIAL_QUICK_TEST_COUNT]
-        
-        async with aiohttp.ClientSession() as session:
-            tasks = [test_proxy(session, proxy) for proxy in quick_test_proxies]
-            results = await asyncio.gather(*tasks)
-            initial_proxies = [res for res in results if res]
-        
-        if initial_proxies:
-            VALIDATED_PROXIES = initial_proxies
-            logger.info(f"Quick test complete. Found {len(VALIDATED_PROXIES)} initial working proxies. Bot is ready.")
-        else:
-            logger.warning("Quick test found no working proxies. Starting full scan immediately.")
-
-        logger.info("Continuing with full validation in the background...")
-        full_validated = list(VALIDATED_PROXIES)
-        remaining_proxies = proxy_list[INITIAL_QUICK_TEST_COUNT:]
-        
-        async with aiohttp.ClientSession() as session:
-            tasks = [test_proxy(session, proxy) for proxy in remaining_proxies]
-            for i in range(0, len(tasks), MAX_CONCURRENT_TESTS):
-                batch = tasks[i:i + MAX_CONCURRENT_TESTS]
-                results = await asyncio.gather(*batch)
-                full_validated.extend([res for res in results if res])
-                logger.debug(f"Background validation progress: Total valid proxies so far: {len(full_validated)}")
-
-        if full_validated:
-            logger.info(f"Full validation complete. Total working proxies: {len(full_validated)}.")
-            VALIDATED_PROXIES = full_validated
-        else:
-            logger.warning("Full validation could not find any working proxies.")
-            VALIDATED_PROXIES = []
-
-
-def get_random_proxy() -> str | None:
-    """یک پراکسی شانسی از لیست معتبر برمی‌گرداند."""
-    if VALIDATED_PROXIES:
-        return random.choice(VALIDATED_PROXIES)
-    return None
+        async with _new_test_session() as session:
+            known = set() if full else RAW_PROXIES
+            fetched: set[str] = set()
+            new_candidates = 0
+
+            async def candidates() -> AsyncIterator[str]:
+                # منابع یکی پس از دیگری و همزمان با تست خوانده می‌شوند؛ تنها ورودی‌های جدید تست می‌شوند
+                nonlocal new_candidates
+                for url in PROXY_SOURCES:
+                    async for proxy in _stream_proxies_from_url(session, url):
+                        if proxy in fetched:
+                            continue
+                        fetched.add(proxy)
+                        if proxy not in known and proxy not in proxy_pool:
+                            new_candidates += 1
+                            yield proxy
+
+            found = await _test_stream(session, _shuffled(candidates(), MAX_CONCURRENT_TESTS * 2))
+            if not fetched:
+                logger.error("Could not fetch any proxies from any source. Keeping the current pool.")
+                return
+            # ورودی‌هایی که از منابع حذف شده‌اند فراموش می‌شوند تا در صورت بازگشت دوباره تست شوند
+            RAW_PROXIES = fetched
+            logger.info(f"Fetched {len(fetched)} unique raw proxies from {len(PROXY_SOURCES)} sources; "
+                        f"tested {new_candidates} new candidates.")
+
+        logger.info(f"Proxy update complete. {found} new working proxies, pool size: {len(proxy_pool)}, "
+                    f"median latency: {proxy_pool.stats()['median_latency']}s.")
+    await persist_proxy_health()
+
+async def _bounded(limit: asyncio.Semaphore, coro: Awaitable[T]) -> T:
+    async with limit:
+        return await coro
+
+async def revalidate_proxies():
+    """
+    بازبینی تدریجی: در هر اجرا تنها چند پراکسی که بیشترین زمان از آخرین تست آن‌ها گذشته
+    دوباره تست می‌شوند تا استخر بدون اسکن کامل به‌روز بماند.
+    """
+    stale = proxy_pool.stalest(REVALIDATION_BATCH_SIZE)
+    if not stale:
+        return
+    targets = _probe_targets()
+    # تست‌ها و probe ها همانند اسکن منابع حداکثر MAX_CONCURRENT_TESTS اتصال همزمان دارند
+    limit = asyncio.Semaphore(MAX_CONCURRENT_TESTS)
+    async with _new_test_session() as session:
+        results = await asyncio.gather(*(_bounded(limit, test_proxy(session, proxy)) for proxy in stale))
+        removed = 0
+        working = []
+        for proxy, res in zip(stale, results):
+            if res:
+                proxy_pool.add(*res)
+                working.append(proxy)
+            elif proxy_pool.record_failure(proxy, checked=True):
+                removed += 1
+
+        # پراکسی‌های سالم روی هاست واقعی هر سرویس هم تست می‌شوند
+        probes = [(proxy, target, url) for proxy in working for target, url in targets.items()]
+        outcomes = await asyncio.gather(*(_bounded(limit, probe_proxy(session, proxy, url)) for proxy, _, url in probes))
+        for (proxy, target, _), ok in zip(probes, outcomes):
+            proxy_pool.record_probe(proxy, target, ok)
+    if removed:
+        logger.info(f"Revalidation removed {removed} dead proxies. Pool size: {len(proxy_pool)}")
+    if MAINTAIN_PROXIES and len(proxy_pool) < REVALIDATION_THRESHOLD and not VALIDATION_LOCK.locked():
+        asyncio.create_task(update_and_test_proxies(full=True))
+
+async def load_proxy_health():
+    """پراکسی‌های سالم ذخیره شده را بارگذاری می‌کند تا ربات پس از راه‌اندازی مجدد فوراً از آن‌ها استفاده کند."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=PROXY_HEALTH_MAX_AGE)
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(ProxyHealth).where(ProxyHealth.checked_at >= cutoff))).scalars().all()
+    records = []
+    for row in rows:
+        stats = ProxyStats(row.proxy, row.latency)
+        stats.health = row.health
+        stats.successes = row.successes or 0
+        stats.failures = row.failures or 0
+        stats.updated_at = stats.checked_at = row.checked_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        stats.targets = json.loads(row.targets or '{}')
+        records.append(stats)
+    proxy_pool.restore(records)
+    logger.info(f"Loaded {len(records)} persisted proxies into the pool.")
+
+async def persist_proxy_health():
+    """وضعیت فعلی استخر پراکسی را در جدول proxy_health ذخیره می‌کند."""
+    rows = [
+        ProxyHealth(
+            proxy=s.proxy, latency=s.latency, health=s.health, successes=s.successes, failures=s.failures,
+            checked_at=datetime.datetime.utcfromtimestamp(s.checked_at), targets=json.dumps(s.targets),
+        )
+        for s in proxy_pool.snapshot()
+    ]
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(ProxyHealth))
+        session.add_all(rows)
+        await session.commit()
+
+
+def get_random_proxy(target: str | None = None, exclude: Collection[str] = ()) -> str | None:
+    """
+    یک پراکسی از استخر معتبر برمی‌گرداند؛ پراکسی‌های سریع‌تر و سالم‌تر شانس بیشتری دارند.
+    target (نام سرویس) پراکسی‌هایی را ترجیح می‌دهد که روی هاست همان سرویس تایید شده‌اند.
+    """
+    return proxy_pool.choose(target, exclude)
+
+def report_proxy_success(proxy: str, latency: float | None = None, target: str | None = None):
+    """موفقیت یک درخواست از طریق پراکسی را در سابقه آن ثبت می‌کند."""
+    proxy_pool.record_success(proxy, latency, target)
 
-def handle_proxy_failure(failed_proxy: str):
-    """یک پراکسی خراب را از لیست حذف کرده و در صورت نیاز، تست مجدد را فعال می‌کند."""
-    global VALIDATED_PROXIES
-    if failed_proxy in VALIDATED_PROXIES:
-        VALIDATED_PROXIES.remove(failed_proxy)
-        logger.warning(f"Removed failed proxy. Remaining valid proxies: {len(VALIDATED_PROXIES)}")
+def handle_proxy_failure(failed_proxy: str, target: str | None = None):
+    """امتیاز یک پراکسی خراب را کاهش داده و در صورت کم شدن پراکسی‌ها، تست مجدد را فعال می‌کند."""
+    if proxy_pool.record_failure(failed_proxy, target=target):
+        logger.warning(f"Removed failed proxy. Remaining valid proxies: {len(proxy_pool)}")
 
-        if len(VALIDATED_PROXIES) < REVALIDATION_THRESHOLD and not VALIDATION_LOCK.locked():
+        if MAINTAIN_PROXIES and len(proxy_pool) < REVALIDATION_THRESHOLD and not VALIDATION_LOCK.locked():
             logger.warning("Proxy count below threshold. Triggering re-validation.")
-            asyncio.create_task(update_and_test_proxies())
\ No newline at end of file
+            asyncio.create_task(update_and_test_proxies(full=True))
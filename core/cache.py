@@ -0,0 +1,106 @@
+# core/cache.py
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Hashable
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# تمام کش‌های ساخته شده برای گزارش‌گیری دوره‌ای در اینجا ثبت می‌شوند
+_REGISTRY: dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """
+    یک کش درون‌حافظه‌ای محدود (LRU) که هر ورودی آن پس از مدت مشخصی منقضی می‌شود.
+    شمارنده‌های hit/miss/eviction برای لاگ کردن در دسترس هستند.
+    """
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _REGISTRY[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """مقدار یک کلید را برمی‌گرداند و آن را به انتهای صف LRU منتقل می‌کند."""
+        item = self._data.get(key)
+        if item is None:
+            if count:
+                self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """یک مقدار را ذخیره می‌کند و در صورت پر بودن، قدیمی‌ترین ورودی را حذف می‌کند."""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """یک کلید را حذف کرده و مقدار (منقضی نشده) آن را برمی‌گرداند."""
+        value = self.get(key, _MISSING, count=False)
+        self._data.pop(key, None)
+        return default if value is _MISSING else value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def purge_expired(self) -> int:
+        """ورودی‌های منقضی شده‌ای را که دیگر خوانده نمی‌شوند حذف کرده و تعداد آن‌ها را برمی‌گرداند."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in list(self._data.items()) if expires_at < now]
+        for key in expired:
+            self._data.pop(key, None)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        """شمارنده‌های کش را به صورت دیکشنری برمی‌گرداند."""
+        return {
+            'size': len(self._data), 'max_size': self.max_size,
+            'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'expirations': self.expirations,
+        }
+
+def get_all_cache_stats() -> dict[str, dict]:
+    """آمار تمام کش‌های ثبت شده را برمی‌گرداند."""
+    return {name: cache.stats() for name, cache in _REGISTRY.items()}
+
+def sweep_caches() -> None:
+    """ورودی‌های منقضی شده تمام کش‌ها را حذف می‌کند (توسط زمان‌بند به صورت دوره‌ای اجرا می‌شود)."""
+    removed = sum(cache.purge_expired() for cache in list(_REGISTRY.values()))
+    if removed:
+        logger.info(f"Cache sweep removed {removed} expired entries.")
+
+def log_cache_stats() -> None:
+    """آمار تمام کش‌ها را در لاگ ثبت می‌کند."""
+    for name, stats in get_all_cache_stats().items():
+        logger.info(
+            f"Cache '{name}': size={stats['size']}/{stats['max_size']} hits={stats['hits']} "
+            f"misses={stats['misses']} evictions={stats['evictions']} expirations={stats['expirations']}"
+        )
@@ -0,0 +1,81 @@
+# core/file_cache.py
+
+import logging
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from core.cache import TTLCache
+from core.settings import settings
+from database.database import AsyncSessionLocal
+from database.models import FileCache
+
+logger = logging.getLogger(__name__)
+
+# لایه LRU جلوی جدول file_cache تا لینک‌های پرتکرار به SQLite نرسند
+file_cache_lru = TTLCache('file_cache', settings.FILE_CACHE_MAX_SIZE, settings.FILE_CACHE_TTL)
+
+# کیفیت‌هایی که در دانلودر عمومی به یک فرمت یکسان (بهترین ویدیو) ختم می‌شوند
+_BEST_VIDEO_ALIASES = {'video', 'video_best', 'video_hd'}
+
+def normalize_quality(quality_info: str) -> str:
+    """کیفیت درخواستی را به یک شکل استاندارد برای کلید کش تبدیل می‌کند."""
+    quality = (quality_info or '').strip().lower()
+    if 'audio' in quality:
+        return 'audio'
+    if quality in _BEST_VIDEO_ALIASES:
+        return 'video_best'
+    return quality
+
+def build_cache_key(service: str, resource_id: str, quality_info: str) -> str:
+    """
+    کلید یکتای کش را از سه‌تایی (سرویس، شناسه منبع، کیفیت) می‌سازد.
+    شناسه منبع حساس به حروف است (مثلاً شناسه ویدیوهای یوتیوب) و تغییر نمی‌کند.
+    """
+    return f"{(service or '').strip().lower()}:{resource_id.strip()}:{normalize_quality(quality_info)}"
+
+async def get_cached_file(cache_key: str) -> FileCache | None:
+    """رکورد کش شده یک فایل را ابتدا از حافظه و سپس از دیتابیس برمی‌گرداند."""
+    entry = file_cache_lru.get(cache_key)
+    if entry is not None:
+        return entry
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(FileCache).filter(FileCache.original_url == cache_key))
+        entry = result.scalars().first()
+    if entry is not None:
+        file_cache_lru.set(cache_key, entry)
+    return entry
+
+def invalidate_cached_file(cache_key: str) -> None:
+    """ورودی یک کلید را از کش حافظه حذف می‌کند (مثلاً وقتی file_id نامعتبر شده است)."""
+    file_cache_lru.pop(cache_key)
+
+async def save_cached_file(cache_key: str, sent_message) -> None:
+    """file_id پیام ارسال شده را برای استفاده مجدد در کش ذخیره می‌کند."""
+    if sent_message.audio:
+        media, file_type = sent_message.audio, 'audio'
+    elif sent_message.video:
+        media, file_type = sent_message.video, 'video'
+    else:
+        return
+
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(FileCache).filter(FileCache.original_url == cache_key))
+            entry = result.scalars().first()
+            if entry:
+                entry.file_id = media.file_id
+                entry.file_type = file_type
+                entry.file_size = media.file_size
+            else:
+                entry = FileCache(
+                    original_url=cache_key, file_id=media.file_id,
+                    file_type=file_type, file_size=media.file_size
+                )
+                db.add(entry)
+            await db.commit()
+        file_cache_lru.set(cache_key, entry)
+    except IntegrityError:
+        # درخواست همزمان دیگری همین کلید را زودتر ثبت کرده است
+        logger.debug(f"File cache entry for '{cache_key}' was inserted concurrently.")
+    except Exception as e:
+        logger.error(f"Failed to save file cache entry for '{cache_key}': {e}", exc_info=True)
@@ -1,11 +1,11 @@
 # nzrmohammad/multi-downloader-bot/Multi-Downloader-Bot-51607f5e4788060c5ecbbd007b59d05e883abb58/core/handlers/admin/broadcast.py
 
-import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from database.database import AsyncSessionLocal
 from core.handlers import user_manager
+from core.rate_limiter import PRIORITY_BROADCAST
 from . import states
 
 async def receive_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -29,14 +29,17 @@ async def execute_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE)
     async with AsyncSessionLocal() as session:
         user_ids = await user_manager.get_all_user_ids(session)
     
+    # فاصله ارسال‌ها را محدودکننده نرخ تعیین می‌کند؛ پاسخ به کاربران همیشه جلوتر از ارسال همگانی است
     successful, failed = 0, 0
     for user_id in user_ids:
         try:
-            await context.bot.copy_message(chat_id=user_id, from_chat_id=message.chat_id, message_id=message.message_id)
+            await context.bot.copy_message(
+                chat_id=user_id, from_chat_id=message.chat_id, message_id=message.message_id,
+                rate_limit_args={'priority': PRIORITY_BROADCAST},
+            )
             successful += 1
         except Exception:
             failed += 1
-        await asyncio.sleep(0.1)
     
     await query.edit_message_text(f"✅ **ارسال تمام شد**\n\n▪️ موفق: {successful}\n▪️ ناموفق: {failed}", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ بازگشت", callback_data="admin:main")]]))
     return states.ADMIN_MAIN
\ No newline at end of file
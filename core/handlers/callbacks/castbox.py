@@ -2,6 +2,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from services.castbox import CastboxService
+from core.result_store import result_store, EXPIRED_LIST_TEXT
 
 async def handle_castbox_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user):
     query = update.callback_query
@@ -14,8 +15,10 @@ async def handle_castbox_callback(update: Update, context: ContextTypes.DEFAULT_
     if command == 'page':
         page = int(params[0])
         chat_id = int(params[1])
-        episodes = context.bot_data.get(f"castbox_eps_{chat_id}", [])
-        if episodes:
+        episodes = result_store.get(result_store.make_key('castbox_eps', chat_id, query.message.message_id))
+        if not episodes:
+            await query.edit_message_text(EXPIRED_LIST_TEXT)
+        else:
             keyboard = castbox_service.build_episode_keyboard(episodes, chat_id=chat_id, page=page)
             await query.edit_message_reply_markup(reply_markup=keyboard)
             
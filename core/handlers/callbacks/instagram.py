@@ -7,6 +7,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from pydantic_core import ValidationError
 from services.instagram import InstagramService
+from core.utils import upload_file
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +55,7 @@ async def handle_instagram_profile_callback(update: Update, context: ContextType
 
         await query.message.reply_text(f"✅ دانلود {len(download_paths)} فایل کامل شد. در حال آپلود...")
         for path in download_paths:
-            with open(path, 'rb') as file_to_send:
+            with upload_file(path) as file_to_send:
                 if Path(path).suffix == ".mp4":
                     await context.bot.send_video(chat_id=query.message.chat_id, video=file_to_send)
                 else:
@@ -3,6 +3,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from services.youtube import YoutubeService
+from core.result_store import result_store, EXPIRED_LIST_TEXT
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +16,14 @@ async def handle_youtube_channel_callback(update: Update, context: ContextTypes.
     page = int(page_str)
     chat_id = int(chat_id_str)
 
-    playlists = context.bot_data.get(f"yt_pls_{chat_id}", [])
-    if playlists:
-        youtube_service = YoutubeService()
-        keyboard = youtube_service.build_playlist_keyboard(playlists, chat_id, page=page)
-        try:
-            await query.edit_message_reply_markup(reply_markup=keyboard)
-        except Exception as e:
-            logger.warning(f"Could not edit YouTube channel page message: {e}")
\ No newline at end of file
+    playlists = result_store.get(result_store.make_key('yt_pls', chat_id, query.message.message_id))
+    if not playlists:
+        await query.edit_message_text(EXPIRED_LIST_TEXT)
+        return
+
+    youtube_service = YoutubeService()
+    keyboard = youtube_service.build_playlist_keyboard(playlists, chat_id, page=page)
+    try:
+        await query.edit_message_reply_markup(reply_markup=keyboard)
+    except Exception as e:
+        logger.warning(f"Could not edit YouTube channel page message: {e}")
\ No newline at end of file
@@ -1,31 +1,38 @@
 # nzrmohammad/multi-downloader-bot/Multi-Downloader-Bot-51607f5e4788060c5ecbbd007b59d05e883abb58/core/handlers/dispatch_handler.py
 
 import re
+import asyncio
 import logging
-from urllib.parse import urlparse
-import requests
+import weakref
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from database.database import AsyncSessionLocal
-from services import SERVICES
+from services.router import route_url
 from core.handlers import user_manager
-from .service_manager import get_service_status
+from core.settings import settings
+from core.url_resolver import resolve_short_url
+from .service_manager import is_service_enabled
 
 logger = logging.getLogger(__name__)
 URL_REGEX = r"(https?://[^\s]+)"
 
-def resolve_shortened_url(url: str) -> str:
-    """لینک‌های کوتاه شده را به لینک اصلی تبدیل می‌کند."""
-    parsed_url = urlparse(url)
-    if 'on.soundcloud.com' in parsed_url.netloc:
-        try:
-            response = requests.head(url, allow_redirects=True, timeout=5)
-            if response.status_code == 200 and response.url != url:
-                return response.url
-        except requests.RequestException:
-            return url
-    return url
+# سقف همزمانی هر سرویس بین همه کاربران مشترک است؛ سقف هر کاربر تنها تا زمانی
+# که دسته لینک‌های او در حال پردازش است نگه داشته می‌شود
+_service_semaphores: dict[str, asyncio.Semaphore] = {}
+_user_semaphores: "weakref.WeakValueDictionary[int, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+def _service_semaphore(name: str) -> asyncio.Semaphore:
+    if name not in _service_semaphores:
+        _service_semaphores[name] = asyncio.Semaphore(settings.BATCH_CONCURRENCY_PER_SERVICE)
+    return _service_semaphores[name]
+
+def _user_semaphore(user_id: int) -> asyncio.Semaphore:
+    semaphore = _user_semaphores.get(user_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY_PER_USER)
+        _user_semaphores[user_id] = semaphore
+    return semaphore
 
 async def dispatch_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """لینک‌ها را شناسایی کرده و به سرویس مناسب ارسال می‌کند."""
@@ -46,34 +53,46 @@ async def dispatch_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(f"شما مجاز به ارسال حداکثر {batch_limit} لینک در یک پیام هستید.")
             return
         
-        if len(urls) > 1:
-            await update.message.reply_text(f"✅ {len(urls)} لینک دریافت شد. دانلودها به زودی ارسال خواهند شد.")
-
-        for url in urls:
-            # --- FIX: تمیز کردن لینک از کاراکترهای اضافی و اشتباه در انتها ---
-            cleaned_url = url.rstrip('`\'">.,').replace('%60', '')
-            
-            resolved_url = resolve_shortened_url(cleaned_url)
-            found_service = False
-            for service in SERVICES:
-                service_name = service.__class__.__name__.replace("Service", "").lower()
-                service_is_enabled = await get_service_status(service_name)
-                if not service_is_enabled: 
-                    continue
-                
-                if await service.can_handle(resolved_url):
-                    try:
-                        await service.process(update, context, user, resolved_url)
-                    except Exception as e:
-                        logger.error(f"Error processing {url} with {service_name}: {e}", exc_info=True)
-                        await context.bot.send_message(chat_id=user.user_id, text=f"❌ در پردازش لینک زیر خطایی رخ داد:\n`{url}`", parse_mode='Markdown')
-                    found_service = True
-                    break
-            
-            if not found_service:
-                # --- FIX: افزودن parse_mode و نمایش لینک تمیز شده ---
-                await context.bot.send_message(
-                    chat_id=user.user_id, 
-                    text=f"لینک زیر پشتیبانی نمی‌شود: `{resolved_url}`",
-                    parse_mode='Markdown'
-                )
\ No newline at end of file
+        if len(urls) == 1:
+            await _process_link(update, context, user, urls[0])
+            return
+
+        await update.message.reply_text(f"✅ {len(urls)} لینک دریافت شد. دانلودها به زودی ارسال خواهند شد.")
+
+        # لینک‌ها همزمان پردازش می‌شوند و نتیجه هر لینک به محض آماده شدن ارسال می‌شود
+        user_limit = _user_semaphore(user.user_id)
+
+        async def run(url: str) -> bool:
+            async with user_limit:
+                return await _process_link(update, context, user, url)
+
+        results = await asyncio.gather(*(run(url) for url in urls), return_exceptions=True)
+        failed = sum(1 for result in results if result is not True)
+        if failed:
+            await update.message.reply_text(f"پردازش {len(urls)} لینک تمام شد؛ {failed} لینک ناموفق بود.")
+
+async def _process_link(update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str) -> bool:
+    """یک لینک را به سرویس مناسب می‌سپارد؛ در صورت موفقیت True برمی‌گرداند."""
+    # --- FIX: تمیز کردن لینک از کاراکترهای اضافی و اشتباه در انتها ---
+    cleaned_url = url.rstrip('`\'">.,').replace('%60', '')
+
+    resolved_url = await resolve_short_url(cleaned_url)
+    # انتخاب سرویس از ایندکس دامنه‌ها به جای بررسی تک‌تک سرویس‌ها
+    route = route_url(resolved_url)
+    if not (route and is_service_enabled(route.service.name) and route.service.is_available()):
+        # --- FIX: افزودن parse_mode و نمایش لینک تمیز شده ---
+        await context.bot.send_message(
+            chat_id=user.user_id,
+            text=f"لینک زیر پشتیبانی نمی‌شود: `{resolved_url}`",
+            parse_mode='Markdown'
+        )
+        return False
+
+    try:
+        async with _service_semaphore(route.service.name):
+            await route.service.process(update, context, user, resolved_url)
+        return True
+    except Exception as e:
+        logger.error(f"Error processing {url} with {route.service.name}: {e}", exc_info=True)
+        await context.bot.send_message(chat_id=user.user_id, text=f"❌ در پردازش لینک زیر خطایی رخ داد:\n`{url}`", parse_mode='Markdown')
+        return False
@@ -0,0 +1,86 @@
+# core/handlers/download/backends.py
+
+import logging
+
+from core.settings import settings
+from core.utils import MessageRef
+from core.request_state import request_state
+from .queue import download_queue, TIER_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+async def run_download_job(bot, user, dl_info: dict, message: MessageRef):
+    """خط لوله مناسب (اسپاتیفای یا yt-dlp) را برای یک درخواست دانلود اجرا می‌کند."""
+    from .downloader_general import execute_download
+    from .downloader_spotify import execute_spotify_download
+
+    if dl_info.get('service') == 'spotify':
+        await execute_spotify_download(bot, user, dl_info['resource_id'], message, dl_info.get('original_message_caption', ''))
+    else:
+        await execute_download(bot, user, dl_info, message)
+
+class InProcessBackend:
+    """دانلودها را در همین پردازه و در صف اولویت‌دار download_queue اجرا می‌کند."""
+    name = 'local'
+
+    async def submit(self, request_key: str, user, dl_info: dict, message: MessageRef, bot,
+                     on_finish=None, on_position=None) -> int | None:
+        """درخواست را در صف قرار داده و جایگاه آن در صف را برمی‌گرداند."""
+        async def job():
+            try:
+                await run_download_job(bot, user, dl_info, message)
+            finally:
+                if on_finish:
+                    await on_finish(request_key)
+
+        return download_queue.enqueue(request_key, user.user_id, user.subscription_tier, job, on_position)
+
+    async def cancel(self, request_key: str) -> bool:
+        return download_queue.cancel(request_key)
+
+    def is_waiting(self, position: int | None) -> bool:
+        """آیا درخواست باید منتظر آزاد شدن یک worker بماند."""
+        return bool(position) and position > download_queue.workers - download_queue.stats()['running']
+
+class CeleryBackend:
+    """
+    دانلودها را به worker های Celery (پردازه یا کانتینر جداگانه) می‌سپارد
+    تا پردازش سنگین yt-dlp/ffmpeg حلقه رویداد ربات را مسدود نکند.
+    """
+    name = 'celery'
+
+    async def submit(self, request_key: str, user, dl_info: dict, message: MessageRef, bot,
+                     on_finish=None, on_position=None) -> int | None:
+        # جایگاه در صف broker قابل محاسبه نیست؛ کاربر فقط پیام «در صف» را می‌بیند
+        from tasks import download_task
+        result = download_task.apply_async(
+            kwargs={'user_id': user.user_id, 'dl_info': dl_info, 'message': message.to_dict()},
+            priority=TIER_PRIORITY.get(user.subscription_tier, len(TIER_PRIORITY)),
+        )
+        await request_state.put_task_id(request_key, result.id)
+        return None
+
+    async def cancel(self, request_key: str) -> bool:
+        from tasks import celery_app
+        task_id = await request_state.pop_task_id(request_key)
+        if not task_id:
+            return False
+        # terminate=True پردازه worker را (همراه با yt-dlp در حال اجرا) متوقف می‌کند
+        celery_app.control.revoke(task_id, terminate=True)
+        return True
+
+    def is_waiting(self, position: int | None) -> bool:
+        return True
+
+def get_download_backend():
+    """backend اجرای دانلود را بر اساس تنظیمات DOWNLOAD_BACKEND برمی‌گرداند."""
+    if settings.DOWNLOAD_BACKEND == 'celery':
+        if settings.REQUEST_STATE_BACKEND != 'redis':
+            # پرچم لغو و آدرس‌ها باید بین ربات و worker ها مشترک باشند
+            raise ValueError("DOWNLOAD_BACKEND=celery نیاز به REQUEST_STATE_BACKEND=redis دارد.")
+        return CeleryBackend()
+    if settings.DOWNLOAD_BACKEND != 'local':
+        logger.warning(f"Unknown DOWNLOAD_BACKEND '{settings.DOWNLOAD_BACKEND}', falling back to in-process downloads.")
+    return InProcessBackend()
+
+download_backend = get_download_backend()
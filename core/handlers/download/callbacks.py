@@ -5,14 +5,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 # توابع دانلود از ماژول‌های جدید وارد می‌شوند
-from .downloader_general import start_actual_download
 from .downloader_playlist import handle_playlist_zip_download
-from .downloader_spotify import handle_spotify_download
-
-# Global dictionaries to manage download state
-download_requests = {}
-cancelled_tasks = {}
-url_cache = {}
+from .backends import download_backend
+from core.utils import edit_message_safe, MessageRef
+from core.request_state import request_state, DownloadRequest
 
 async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user):
     query = update.callback_query
@@ -26,10 +22,9 @@ async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT
         quality_info = parts[3]
         resource_id = parts[4]
         request_key = str(uuid.uuid4())
-        download_requests[request_key] = {
-            'service': service, 'quality': quality_info, 'resource_id': resource_id,
-            'user_id': user.user_id, 'original_message_caption': query.message.caption or query.message.text
-        }
+        await request_state.put_request(request_key, DownloadRequest(
+            service, quality_info, resource_id, user.user_id, query.message.caption or query.message.text
+        ))
         keyboard = [
             [InlineKeyboardButton("✅ بله، دانلود کن", callback_data=f"dl:confirm:{request_key}")],
             [InlineKeyboardButton("❌ لغو", callback_data="dl:cancel")]
@@ -37,31 +32,62 @@ async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT
         text = "آیا برای شروع دانلود آماده‌اید؟"
         
         # استفاده از تابع کمکی برای ویرایش پیام
-        from core.utils import edit_message_safe
         await edit_message_safe(query, f"{query.message.caption or query.message.text}\n\n{text}", query.message.photo, InlineKeyboardMarkup(keyboard))
 
     elif command == 'confirm':
         request_key = parts[2]
-        if request_key not in download_requests or download_requests[request_key]['user_id'] != user.user_id:
+        pending = await request_state.get_request(request_key)
+        if not pending or pending.user_id != user.user_id:
             await query.message.edit_text("این درخواست نامعتبر یا منقضی شده است.")
             return
-            
-        cancelled_tasks[request_key] = False
-        dl_info = download_requests.pop(request_key)
-        
-        # مسیریابی به تابع دانلود مناسب
-        if dl_info.get('service') == 'spotify':
-            await handle_spotify_download(query, user, dl_info['resource_id'], context, dl_info.get('original_message_caption', ''))
-        else:
-            await start_actual_download(query, user, dl_info, context)
+        if not await request_state.pop_request(request_key):
+            # درخواست همزمان توسط کلیک دیگری تایید شده است
+            return
+
+        await request_state.set_cancelled(request_key, False)
+        dl_info = pending.to_dl_info()
+        dl_info['request_key'] = request_key
+        if dl_info.get('service') == 'bandcamp':
+            # آدرس کامل پیش از ارسال به صف خوانده می‌شود تا worker ها به وضعیت درخواست‌ها وابسته نباشند
+            dl_info['download_url'] = await request_state.get_url(dl_info['resource_id']) or dl_info['resource_id']
+
+        message = MessageRef.from_query(query)
+        bot = context.bot
+
+        async def show_position(position: int):
+            # با شروع یا لغو دانلودهای جلوتر، جایگاه نمایش داده شده به‌روز می‌شود
+            await message.edit(bot, _queued_text(position), cancel_keyboard(request_key))
+
+        # دانلود در صف اولویت‌دار (یا worker های جداگانه) قرار می‌گیرد تا تعداد دانلودهای همزمان محدود بماند
+        position = await download_backend.submit(
+            request_key, user, dl_info, message, bot, on_finish=_clear_cancel_flag, on_position=show_position
+        )
+        if download_backend.is_waiting(position):
+            await edit_message_safe(query, _queued_text(position), query.message.photo, cancel_keyboard(request_key))
 
 
     elif command == 'cancel':
         if len(parts) > 2:
             request_key = parts[2]
-            cancelled_tasks[request_key] = True
+            await request_state.set_cancelled(request_key, True)
+            await download_backend.cancel(request_key)
         await query.message.delete()
 
+def cancel_keyboard(request_key: str) -> InlineKeyboardMarkup:
+    """دکمه لغو یک دانلود در صف یا در حال اجرا را می‌سازد."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("❌ لغو دانلود", callback_data=f"dl:cancel:{request_key}")]])
+
+def _queued_text(position: int | None) -> str:
+    position_text = f"\n\n**جایگاه شما در صف:** `{position}`" if position else ""
+    return f"⏳ درخواست شما در صف دانلود قرار گرفت.{position_text}"
+
+async def _clear_cancel_flag(request_key: str):
+    await request_state.clear_cancel_flag(request_key)
+
+async def is_cancelled(request_key: str | None) -> bool:
+    """بررسی می‌کند که آیا کاربر دانلود را لغو کرده است."""
+    return bool(request_key) and await request_state.is_cancelled(request_key)
+
 async def handle_playlist_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user):
     # این تابع به ماژول دانلود پلی‌لیست منتقل شده است
     await handle_playlist_zip_download(update, context, user)
\ No newline at end of file
@@ -1,35 +1,66 @@
 # core/handlers/download/downloader_general.py
 
 import os
+import glob
 import logging
 import yt_dlp
 import uuid
 import time
 import asyncio
-from telegram.ext import ContextTypes
+import threading
 from yt_dlp.utils import DownloadError
 
-import config
 from core.settings import settings
 from core.handlers import user_manager
+from core.file_cache import build_cache_key, get_cached_file, save_cached_file, invalidate_cached_file
 from core.log_forwarder import forward_download_to_log_channel
-from core.utils import create_progress_bar, edit_message_safe
+from core.utils import create_progress_bar, MessageRef, upload_file
+from core.single_flight import SingleFlight
+from core.proxy_retry import run_with_failover
+from core.shared_state import shared_state
+from core.rate_limiter import PRIORITY_PROGRESS
+from .queue import download_queue
 from database.database import AsyncSessionLocal
 
 
 logger = logging.getLogger(__name__)
 
+# ویرایش‌های پیشرفت پس از پاسخ‌های کاربران ارسال می‌شوند
+PROGRESS_RATE_LIMIT = {'priority': PRIORITY_PROGRESS}
+# فاصله بررسی پرچم لغو در وضعیت درخواست‌ها در طول دانلود (ثانیه)
+CANCEL_POLL_INTERVAL = 1.0
+
+class DownloadCancelled(DownloadError):
+    """دانلود توسط کاربری که آن را شروع کرده لغو شد."""
+
+class PlanLimitExceeded(DownloadError):
+    """حجم فایل از سقف پلن کاربری که دانلود را شروع کرده بیشتر است."""
+
+# خطاهایی که فقط به کاربر اصلی مربوط‌اند و نباید به کاربران منتظر همان فایل برسند
+USER_SPECIFIC_ERRORS = (DownloadCancelled, PlanLimitExceeded)
+
+# ادغام دانلودهای همزمان با کلید کش یکسان (service:resource_id:quality)
+download_flights = SingleFlight('downloads')
+
 async def start_actual_download(query, user, dl_info, context):
-    from core.handlers.download.callbacks import url_cache
     """منطق اصلی دانلود از سرویس‌های عمومی با استفاده از yt-dlp."""
+    await execute_download(context.bot, user, dl_info, MessageRef.from_query(query))
+
+async def execute_download(bot, user, dl_info: dict, message: MessageRef):
+    """
+    خط لوله کامل دانلود (کش، ادغام درخواست‌ها، yt-dlp و آپلود).
+    فقط به bot و ارجاع پیام نیاز دارد تا در worker های جداگانه نیز قابل اجرا باشد.
+    """
+    from core.handlers.download.callbacks import is_cancelled
     if not user_manager.can_download(user):
-        await edit_message_safe(query, "شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕", query.message.photo)
+        await message.edit(bot, "شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕")
         return
 
     service = dl_info.get('service')
     quality_info = dl_info['quality']
     resource_id = dl_info['resource_id']
     original_caption = dl_info.get('original_message_caption', '')
+    request_key = dl_info.get('request_key')
 
     # --- FIX: افزودن Dailymotion به لیست ---
     url_map = {
@@ -44,22 +75,111 @@ async def start_actual_download(query, user, dl_info, context):
         'vimeo': f"https://vimeo.com/{resource_id}",
         'tiktok': f"https://www.tiktok.com/t/c/{resource_id}" # یک فرمت رایج برای لینک تیک‌تاک
     }
-    download_url = url_map.get(service, resource_id)
+    # آدرس بندکمپ پیش از ارسال به صف از وضعیت درخواست‌ها (core/request_state.py) خوانده و در dl_info قرار می‌گیرد
+    download_url = dl_info.get('download_url') or url_map.get(service, resource_id)
 
-    if service == 'bandcamp':
-        download_url = url_cache.pop(resource_id, resource_id)
+    # شناسه‌های بندکمپ کلیدهای موقت تصادفی هستند؛ برای کش از آدرس کامل استفاده می‌شود
+    cache_key = build_cache_key(service, download_url if service == 'bandcamp' else resource_id, quality_info)
+    file_size_limit = user_manager.get_file_size_limit(user)
+
+    cached = await get_cached_file(cache_key)
+    if cached and (cached.file_size or 0) <= file_size_limit:
+        try:
+            # کپشن پنل اصلی با عنوان محتوا شروع می‌شود
+            caption = original_caption.split('\n', 1)[0].strip() or None
+            await _send_cached_file(bot, user, message, cached.file_id, cached.file_type, caption, service, quality_info, download_url)
+            return
+        except Exception as e:
+            # file_id ممکن است دیگر معتبر نباشد؛ دانلود عادی انجام می‌شود
+            logger.warning(f"Cached file_id for '{cache_key}' could not be re-sent: {e}")
+            invalidate_cached_file(cache_key)
+
+    if download_flights.in_flight(cache_key):
+        await message.edit(bot, "⏳ این فایل هم‌اکنون برای کاربر دیگری در حال دانلود است و به محض آماده شدن برای شما هم ارسال می‌شود...")
 
+    try:
+        # درخواست‌های همزمان برای یک فایل، فقط یک بار دانلود و آپلود می‌شوند
+        sent_message, is_leader = await download_flights.do(
+            cache_key,
+            lambda: _download_once(bot, user, message, service, quality_info, download_url, file_size_limit, cache_key, request_key),
+            private_errors=USER_SPECIFIC_ERRORS,
+        )
+        if is_leader:
+            await save_cached_file(cache_key, sent_message)
+            await _record_download(user, service, quality_info)
+            forward_download_to_log_channel(bot, user, sent_message, service, download_url)
+            await message.delete(bot)
+        else:
+            media = sent_message.audio or sent_message.video
+            if (media.file_size or 0) > file_size_limit:
+                raise PlanLimitExceeded(f"حجم فایل از محدودیت {file_size_limit / 1024**2:.0f} مگابایتی پلن شما بیشتر است.")
+            file_type = 'audio' if sent_message.audio else 'video'
+            await _send_cached_file(bot, user, message, media.file_id, file_type, sent_message.caption, service, quality_info, download_url)
+
+    except DownloadError as e:
+        if await is_cancelled(request_key):
+            logger.info(f"Download {request_key} was cancelled by the user.")
+            return
+        logger.error(f"yt-dlp download error: {e}", exc_info=True)
+        error_message = f"❌ دانلود ممکن نیست. محتوا ممکن است خصوصی، حذف شده یا برای منطقه شما در دسترس نباشد.\n`{e}`"
+        await message.edit(bot, f"{original_caption}\n\n{error_message}")
+    except Exception as e:
+        logger.error(f"Actual download error: {e}", exc_info=True)
+        error_message = "❌ یک خطای پیش‌بینی نشده در هنگام دانلود رخ داد."
+        await message.edit(bot, f"{original_caption}\n\n{error_message}")
+
+async def _download_once(bot, user, message, service, quality_info, download_url, file_size_limit, cache_key, request_key=None):
+    """
+    دانلود را زیر قفل مشترک همان کلید کش انجام می‌دهد تا replica های دیگر یک فایل را همزمان
+    دانلود نکنند؛ اگر در زمان انتظار نمونه دیگری فایل را آپلود کرده باشد، همان file_id ارسال می‌شود.
+    """
+    async with shared_state.lock(f"download:{cache_key}", settings.SHARED_LOCK_TTL):
+        cached = await get_cached_file(cache_key)
+        if cached and (cached.file_size or 0) <= file_size_limit:
+            if cached.file_type == 'audio':
+                return await bot.send_audio(chat_id=user.user_id, audio=cached.file_id)
+            return await bot.send_video(chat_id=user.user_id, video=cached.file_id, supports_streaming=True)
+        return await _download_and_upload(bot, user, message, service, quality_info, download_url, file_size_limit, request_key)
+
+async def _download_and_upload(bot, user, message, service, quality_info, download_url, file_size_limit, request_key=None):
+    """فایل را با yt-dlp دانلود کرده، برای کاربر آپلود می‌کند و پیام ارسال شده را برمی‌گرداند."""
+    from core.handlers.download.callbacks import is_cancelled, cancel_keyboard
     last_update_time = [0]
+    # خطایی که hook برای توقف yt-dlp ایجاد کرده (yt-dlp ممکن است آن را در DownloadError دیگری بپیچد)
+    abort_error: list[DownloadError | None] = [None]
     loop = asyncio.get_running_loop()
-    file_size_limit = user_manager.get_file_size_limit(user)
+    reply_markup = cancel_keyboard(request_key) if request_key else None
+    # نسخه محلی پرچم لغو که hook بدون دسترسی به Redis یا حلقه رویداد می‌خواند
+    cancelled = threading.Event()
+
+    async def watch_cancel():
+        while not cancelled.is_set():
+            try:
+                if await is_cancelled(request_key):
+                    cancelled.set()
+                    return
+            except Exception as e:
+                logger.warning(f"Could not check cancel flag of {request_key}: {e}")
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+
+    def ydl_hook(d):
+        # این تابع در thread دانلود اجرا می‌شود؛ خطای ایجاد شده در اینجا yt-dlp را متوقف می‌کند
+        if cancelled.is_set():
+            abort_error[0] = DownloadCancelled("Download cancelled by user.")
+            raise abort_error[0]
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        if total_bytes > file_size_limit:
+            abort_error[0] = PlanLimitExceeded(f"حجم فایل از محدودیت {file_size_limit / 1024**2:.0f} مگابایتی پلن شما بیشتر است.")
+            raise abort_error[0]
+        asyncio.run_coroutine_threadsafe(progress_hook(d), loop)
 
     async def progress_hook(d):
+        if cancelled.is_set():
+            # پیام دانلود لغو شده ممکن است حذف شده باشد
+            return
         current_time = time.time()
         if d['status'] == 'downloading' and current_time - last_update_time[0] > 2:
             total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            if total_bytes > file_size_limit:
-                raise DownloadError(f"حجم فایل از محدودیت {file_size_limit / 1024**3} گیگابایتی پلن شما بیشتر است.")
-
             if total_bytes > 0:
                 progress = d['downloaded_bytes'] / total_bytes
                 progress_bar = create_progress_bar(progress)
@@ -68,17 +188,19 @@ async def start_actual_download(query, user, dl_info, context):
                 text = (f"**در حال دانلود از سرور...**\n\n"
                         f"{progress_bar} {progress:.0%}\n\n"
                         f"`{downloaded_mb:.1f} MB / {total_mb:.1f} MB`")
-                await edit_message_safe(query, text, query.message.photo)
+                # زمان پیش از ویرایش ثبت می‌شود تا ویرایش‌های منتظر در صف محدودکننده نرخ انباشته نشوند
                 last_update_time[0] = current_time
+                await message.edit(bot, text, reply_markup, rate_limit_args=PROGRESS_RATE_LIMIT)
 
-    await edit_message_safe(query, "✅ درخواست تایید شد. در حال اتصال به سرور...", query.message.photo)
+    await message.edit(bot, "✅ درخواست تایید شد. در حال اتصال به سرور...", reply_markup)
 
+    # همه فایل‌های این دانلود (بخش‌ها، فرمت‌های جدا و تصویر کاور) با این شناسه نام‌گذاری می‌شوند
+    download_id = uuid.uuid4().hex
     ydl_opts_base = {
         'quiet': True, 'no_warnings': True, 'nocheckcertificate': True,
         'legacy_server_connect': True,
-        'progress_hooks': [lambda d: asyncio.run_coroutine_threadsafe(progress_hook(d), loop)],
-        'outtmpl': f'downloads/%(title)s_{uuid.uuid4()}.%(ext)s',
-        'proxy': config.get_random_proxy(),
+        'progress_hooks': [ydl_hook],
+        'outtmpl': f'downloads/%(title)s_{download_id}.%(ext)s',
         'socket_timeout': 300,
     }
 
@@ -87,6 +209,7 @@ async def start_actual_download(query, user, dl_info, context):
         logger.info("Using YouTube cookies file for download.")
 
     filename = None
+    watcher = loop.create_task(watch_cancel()) if request_key else None
     try:
         if 'video' in quality_info:
             format_selector = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
@@ -108,47 +231,82 @@ async def start_actual_download(query, user, dl_info, context):
 
         os.makedirs('downloads', exist_ok=True)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(
-                None, lambda: ydl.extract_info(download_url, download=True)
+        def download(proxy: str | None):
+            try:
+                with yt_dlp.YoutubeDL({**ydl_opts, 'proxy': proxy}) as ydl:
+                    info = ydl.extract_info(download_url, download=True)
+                    return info, ydl.prepare_filename(info)
+            finally:
+                # thread پس از لغو task خودش فایل‌هایی را که هنوز می‌نوشت پاک می‌کند
+                if cancelled.is_set():
+                    _remove_download_files(download_id)
+
+        # در صورت خطای پراکسی، دانلود با پراکسی دیگر (یا مستقیم) دوباره شروع می‌شود
+        try:
+            info, original_filename = await run_with_failover(
+                download, target=service, executor=download_queue.executor,
+                deadline=settings.DOWNLOAD_RETRY_DEADLINE, enforce_deadline=False,
             )
-            original_filename = ydl.prepare_filename(info)
-            if 'audio' in quality_info:
-                filename = os.path.splitext(original_filename)[0] + '.mp3'
-            else:
-                filename = original_filename
+        except DownloadError:
+            if abort_error[0] is not None:
+                raise abort_error[0] from None
+            raise
+        if 'audio' in quality_info:
+            filename = os.path.splitext(original_filename)[0] + '.mp3'
+        else:
+            filename = original_filename
 
-        await edit_message_safe(query, "فایل شما دانلود شد. در حال آپلود به تلگرام... 🚀", query.message.photo)
+        await message.edit(bot, "فایل شما دانلود شد. در حال آپلود به تلگرام... 🚀")
         
         final_caption = info.get('title', 'Downloaded File')
-        async with AsyncSessionLocal() as session:
-            user_db = await session.get(user_manager.User, user.user_id)
+        with upload_file(filename) as file_to_send:
             if 'audio' in quality_info:
-                sent_message = await context.bot.send_audio(
-                    chat_id=user.user_id, audio=open(filename, 'rb'), filename=os.path.basename(filename),
+                return await bot.send_audio(
+                    chat_id=user.user_id, audio=file_to_send, filename=os.path.basename(filename),
                     caption=final_caption, title=info.get('track'), performer=info.get('artist'),
                     duration=info.get('duration')
                 )
-            else:
-                sent_message = await context.bot.send_video(
-                    chat_id=user.user_id, video=open(filename, 'rb'), filename=os.path.basename(filename),
-                    caption=final_caption, supports_streaming=True,
-                    duration=info.get('duration'), width=info.get('width'), height=info.get('height')
-                )
-        
-            await user_manager.increment_download_count(session, user_db)
-            await user_manager.log_activity(session, user_db, 'download', details=f"{service}:{quality_info}")
-        await forward_download_to_log_channel(context, user, sent_message, service, download_url)
-        await query.message.delete()
-
-    except DownloadError as e:
-        logger.error(f"yt-dlp download error: {e}", exc_info=True)
-        error_message = f"❌ دانلود ممکن نیست. محتوا ممکن است خصوصی، حذف شده یا برای منطقه شما در دسترس نباشد.\n`{e}`"
-        await edit_message_safe(query, f"{original_caption}\n\n{error_message}", query.message.photo)
-    except Exception as e:
-        logger.error(f"Actual download error: {e}", exc_info=True)
-        error_message = "❌ یک خطای پیش‌بینی نشده در هنگام دانلود رخ داد."
-        await edit_message_safe(query, f"{original_caption}\n\n{error_message}", query.message.photo)
+            return await bot.send_video(
+                chat_id=user.user_id, video=file_to_send, filename=os.path.basename(filename),
+                caption=final_caption, supports_streaming=True,
+                duration=info.get('duration'), width=info.get('width'), height=info.get('height')
+            )
+    except asyncio.CancelledError:
+        # لغو task در صف: yt-dlp در اولین فراخوانی hook متوقف شده و thread دانلود آزاد می‌شود
+        cancelled.set()
+        _remove_download_files(download_id)
+        raise
     finally:
+        if watcher:
+            watcher.cancel()
         if filename and os.path.exists(filename):
-            os.remove(filename)
\ No newline at end of file
+            os.remove(filename)
+
+def _remove_download_files(download_id: str):
+    """فایل‌های نیمه‌کاره یا کامل یک دانلود را از پوشه downloads حذف می‌کند."""
+    for path in glob.glob(f'downloads/*_{download_id}.*'):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove download file {path}: {e}")
+
+async def _record_download(user, service, quality_info):
+    """آمار دانلود کاربر را به‌روز کرده و فعالیت را ثبت می‌کند."""
+    async with AsyncSessionLocal() as session:
+        user_db = await session.get(user_manager.User, user.user_id)
+        await user_manager.increment_download_count(session, user_db)
+        await user_manager.log_activity(session, user_db, 'download', details=f"{service}:{quality_info}")
+
+async def _send_cached_file(bot, user, message, file_id, file_type, caption, service, quality_info, download_url):
+    """فایلی که قبلاً آپلود شده را بدون دانلود مجدد و تنها با file_id برای کاربر ارسال می‌کند."""
+    if file_type == 'audio':
+        sent_message = await bot.send_audio(chat_id=user.user_id, audio=file_id, caption=caption)
+    else:
+        sent_message = await bot.send_video(
+            chat_id=user.user_id, video=file_id, caption=caption, supports_streaming=True
+        )
+
+    await _record_download(user, service, quality_info)
+    forward_download_to_log_channel(bot, user, sent_message, service, download_url)
+    await message.delete(bot)
+    logger.info(f"Served {service}:{quality_info} by re-sending an existing file_id.")
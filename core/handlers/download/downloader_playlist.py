@@ -10,6 +10,7 @@ from telegram.ext import ContextTypes
 
 import config
 from core.handlers import user_manager
+from core.utils import upload_file
 from database.database import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
@@ -41,7 +42,7 @@ async def handle_playlist_zip_download(update: Update, context: ContextTypes.DEF
             'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3'}],
             'quiet': True,
             'ignoreerrors': True,
-            'proxy': config.get_random_proxy(),
+            'proxy': config.get_random_proxy(target='youtube'),
         }
 
         loop = asyncio.get_running_loop()
@@ -66,7 +67,7 @@ async def handle_playlist_zip_download(update: Update, context: ContextTypes.DEF
 
         await query.edit_message_text("فایل فشرده شد. در حال آپلود...")
 
-        with open(zip_filepath_final, 'rb') as zf:
+        with upload_file(zip_filepath_final) as zf:
             await context.bot.send_document(
                 chat_id=user.user_id,
                 document=zf,
@@ -5,7 +5,6 @@ import uuid
 import time
 import asyncio
 import shutil
-import subprocess
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 from telegram.ext import ContextTypes
@@ -14,7 +13,7 @@ import config
 from core.settings import settings
 from core.handlers import user_manager # <--- تغییر در این خط
 from core.log_forwarder import forward_download_to_log_channel
-from core.utils import edit_message_safe
+from core.utils import MessageRef, upload_file
 from database.database import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
@@ -23,11 +22,15 @@ async def handle_spotify_download(query, user, track_id, context, original_capti
     """
     یک آهنگ اسپاتیفای را با استفاده از آخرین نسخه spotdl دانلود می‌کند.
     """
+    await execute_spotify_download(context.bot, user, track_id, MessageRef.from_query(query), original_caption)
+
+async def execute_spotify_download(bot, user, track_id, message: MessageRef, original_caption):
+    """خط لوله دانلود اسپاتیفای که تنها به bot و ارجاع پیام نیاز دارد."""
     if not user_manager.can_download(user): # <--- افزودن پیشوند
-        await edit_message_safe(query, "شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕", query.message.photo)
+        await message.edit(bot, "شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕")
         return
         
-    await edit_message_safe(query, "✅ درخواست تایید شد. در حال اتصال به سرورهای موسیقی...", query.message.photo)
+    await message.edit(bot, "✅ درخواست تایید شد. در حال اتصال به سرورهای موسیقی...")
 
     download_path = f"downloads/{uuid.uuid4()}"
     os.makedirs(download_path, exist_ok=True)
@@ -61,21 +64,27 @@ async def handle_spotify_download(query, user, track_id, context, original_capti
             "--no-cache"
         ]
         
-        proxy = config.get_random_proxy()
+        # spotdl فایل صوتی را از یوتیوب دریافت می‌کند
+        proxy = config.get_random_proxy(target='youtube')
         if proxy:
             command.extend(["--proxy", proxy])
 
         if settings.INSTAGRAM_PASSWORD and os.path.exists("cookies.txt"):
             command.extend(["--cookie", "cookies.txt"])
 
-        loop = asyncio.get_running_loop()
-        process = await loop.run_in_executor(
-            None,
-            lambda: subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
+        # اجرای غیرهمزمان spotdl تا در صورت لغو دانلود، پردازه نیز متوقف شود
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
         )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
 
         if process.returncode != 0:
-            logger.error(f"spotdl failed. stderr: {process.stderr}")
+            logger.error(f"spotdl failed. stderr: {stderr.decode('utf-8', errors='replace')}")
             raise Exception("سرویس‌دهنده موسیقی قادر به پردازش این لینک نیست.")
 
         downloaded_files = os.listdir(download_path)
@@ -84,7 +93,7 @@ async def handle_spotify_download(query, user, track_id, context, original_capti
         
         filename = os.path.join(download_path, downloaded_files[0])
         
-        await edit_message_safe(query, "فایل با بالاترین کیفیت دانلود شد. در حال آپلود... 🚀", query.message.photo)
+        await message.edit(bot, "فایل با بالاترین کیفیت دانلود شد. در حال آپلود... 🚀")
         
         file_size_mb = os.path.getsize(filename) / 1024 / 1024
         duration_str = time.strftime('%M:%S', time.gmtime(duration_ms / 1000))
@@ -96,8 +105,8 @@ async def handle_spotify_download(query, user, track_id, context, original_capti
         )
 
         async with AsyncSessionLocal() as session:
-            with open(filename, 'rb') as file_to_send:
-                sent_message = await context.bot.send_audio(
+            with upload_file(filename) as file_to_send:
+                sent_message = await bot.send_audio(
                     chat_id=user.user_id, audio=file_to_send,
                     filename=f"{clean_filename_base}.mp3", caption=final_caption,
                     title=title, performer=artists, duration=int(duration_ms / 1000),
@@ -106,13 +115,13 @@ async def handle_spotify_download(query, user, track_id, context, original_capti
             await user_manager.increment_download_count(session, user) # <--- افزودن پیشوند
             await user_manager.log_activity(session, user, 'download', details="spotify:audio_hq") # <--- افزودن پیشوند
         
-        await forward_download_to_log_channel(context, user, sent_message, "spotify_hq", spotify_url)
-        await query.message.delete()
+        forward_download_to_log_channel(bot, user, sent_message, "spotify_hq", spotify_url)
+        await message.delete(bot)
 
     except Exception as e:
         logger.error(f"خطا در دانلود از اسپاتیفای: {e}", exc_info=True)
         error_message = f"❌ خطای پیش‌بینی نشده در دانلود از اسپاتیفای.\n`{e}`"
-        await edit_message_safe(query, f"{original_caption}\n\n{error_message}", query.message.photo)
+        await message.edit(bot, f"{original_caption}\n\n{error_message}")
     finally:
         if os.path.exists(download_path):
             shutil.rmtree(download_path)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# core/handlers/download/queue.py
+
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# اولویت صف بر اساس پلن اشتراک (عدد کمتر = اولویت بالاتر)
+TIER_PRIORITY = {'diamond': 0, 'gold': 1, 'silver': 2, 'bronze': 3, 'free': 4}
+
+class DownloadJob:
+    """یک کار دانلود در صف؛ وضعیت آن یکی از queued, running, done یا cancelled است."""
+    __slots__ = ('key', 'user_id', 'priority', 'seq', 'fn', 'state', 'task', 'on_position', 'position')
+
+    def __init__(self, key: str, user_id: int, priority: int, seq: int, fn: Callable[[], Awaitable[None]],
+                 on_position: Callable[[int], Awaitable[None]] | None = None):
+        self.key = key
+        self.user_id = user_id
+        self.priority = priority
+        self.seq = seq
+        self.fn = fn
+        self.state = 'queued'
+        self.task: asyncio.Task | None = None
+        # با تغییر جایگاه کار در صف فراخوانی می‌شود (مثلاً برای به‌روزرسانی پیام کاربر)
+        self.on_position = on_position
+        self.position: int | None = None
+
+class DownloadQueue:
+    """
+    زمان‌بند دانلودها: تعداد ثابتی worker کارها را به ترتیب اولویت پلن کاربر
+    (و در هر پلن به ترتیب ورود) از صف برداشته و اجرا می‌کنند.
+    yt-dlp نیز در یک thread pool اختصاصی با همین اندازه اجرا می‌شود.
+    """
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download')
+        self._queue: asyncio.PriorityQueue | None = None
+        self._jobs: dict[str, DownloadJob] = {}
+        self._seq = itertools.count()
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+            logger.info(f"Download queue started with {self.workers} workers.")
+
+    def enqueue(self, key: str, user_id: int, tier: str, fn: Callable[[], Awaitable[None]],
+                on_position: Callable[[int], Awaitable[None]] | None = None) -> int:
+        """
+        یک کار را به صف اضافه کرده و جایگاه آن در صف (از ۱) را برمی‌گرداند.
+        on_position با هر تغییر بعدی جایگاه (شروع یا لغو کارهای جلوتر، ورود کار با اولویت بالاتر) فراخوانی می‌شود.
+        """
+        self._ensure_started()
+        job = DownloadJob(key, user_id, TIER_PRIORITY.get(tier, len(TIER_PRIORITY)), next(self._seq), fn, on_position)
+        self._jobs[key] = job
+        self._queue.put_nowait((job.priority, job.seq, key))
+        job.position = self.position(key)
+        self._notify_positions()
+        return job.position
+
+    def position(self, key: str) -> int | None:
+        """جایگاه یک کار در انتظار را برمی‌گرداند (۱ یعنی نفر بعدی)."""
+        job = self._jobs.get(key)
+        if not job or job.state != 'queued':
+            return None
+        return 1 + sum(
+            1 for other in self._jobs.values()
+            if other.state == 'queued' and (other.priority, other.seq) < (job.priority, job.seq)
+        )
+
+    def status(self, key: str) -> dict | None:
+        """وضعیت فعلی یک کار را به همراه جایگاه آن در صف برمی‌گرداند."""
+        job = self._jobs.get(key)
+        if not job:
+            return None
+        return {'state': job.state, 'position': self.position(key)}
+
+    def cancel(self, key: str) -> bool:
+        """کار در انتظار را از صف خارج کرده یا کار در حال اجرا را متوقف می‌کند."""
+        job = self._jobs.get(key)
+        if not job or job.state in ('done', 'cancelled'):
+            return False
+        was_queued = job.state == 'queued'
+        if job.state == 'running' and job.task:
+            job.task.cancel()
+        job.state = 'cancelled'
+        if was_queued:
+            self._notify_positions()
+        return True
+
+    def _notify_positions(self):
+        """جایگاه جدید کارهای در انتظاری را که جایشان در صف تغییر کرده اطلاع می‌دهد."""
+        queued = sorted(
+            (job for job in self._jobs.values() if job.state == 'queued'),
+            key=lambda job: (job.priority, job.seq),
+        )
+        for position, job in enumerate(queued, start=1):
+            if job.position == position:
+                continue
+            job.position = position
+            if job.on_position:
+                asyncio.create_task(self._call_on_position(job, position))
+
+    async def _call_on_position(self, job: DownloadJob, position: int):
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logger.warning(f"Could not report queue position of {job.key}: {e}")
+
+    def stats(self) -> dict:
+        states = [job.state for job in self._jobs.values()]
+        return {'queued': states.count('queued'), 'running': states.count('running'), 'workers': self.workers}
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, key = await self._queue.get()
+            job = self._jobs.get(key)
+            try:
+                if not job or job.state != 'queued':
+                    continue
+                job.state = 'running'
+                self._notify_positions()
+                job.task = asyncio.create_task(job.fn())
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    if not job.task.cancelled():
+                        raise
+                    logger.info(f"Download job {key} was cancelled while running.")
+                except Exception as e:
+                    logger.error(f"Download job {key} failed on worker {index}: {e}", exc_info=True)
+            finally:
+                if job and self._jobs.get(key) is job:
+                    job.state = 'done' if job.state == 'running' else job.state
+                    del self._jobs[key]
+                self._queue.task_done()
+
+download_queue = DownloadQueue(settings.DOWNLOAD_WORKERS)
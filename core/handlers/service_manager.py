@@ -7,6 +7,9 @@ from database.database import AsyncSessionLocal
 from database.models import ServiceStatus
 from services import SERVICES
 
+# نسخه درون‌حافظه‌ای وضعیت سرویس‌ها؛ در initialize_services بارگذاری و با toggle به‌روز می‌شود
+_status_snapshot: dict[str, bool] = {}
+
 def get_service_names() -> list[str]:
     """
     نام تمام سرویس‌های تعریف شده در پروژه را برمی‌گرداند.
@@ -33,15 +36,24 @@ async def initialize_services():
             db.add_all(new_services)
             await db.commit()
 
-async def get_service_status(service_name: str) -> bool:
-    """وضعیت یک سرویس را از دیتابیس به صورت غیرهمزمان می‌خواند."""
+    await reload_service_statuses()
+
+async def reload_service_statuses():
+    """وضعیت تمام سرویس‌ها را یک بار از دیتابیس در حافظه بارگذاری می‌کند."""
     async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(ServiceStatus.is_enabled).filter(ServiceStatus.service_name == service_name)
-        )
-        status = result.scalar_one_or_none()
-        # اگر سرویس در دیتابیس نباشد، به طور پیش‌فرض آن را غیرفعال در نظر می‌گیریم
-        return status if status is not None else False
+        result = await db.execute(select(ServiceStatus.service_name, ServiceStatus.is_enabled))
+        snapshot = {name: bool(enabled) for name, enabled in result.all()}
+    _status_snapshot.clear()
+    _status_snapshot.update(snapshot)
+
+def is_service_enabled(service_name: str) -> bool:
+    """وضعیت یک سرویس را بدون مراجعه به دیتابیس و از نسخه درون‌حافظه‌ای برمی‌گرداند."""
+    # اگر سرویس در دیتابیس نباشد، به طور پیش‌فرض آن را غیرفعال در نظر می‌گیریم
+    return _status_snapshot.get(service_name, False)
+
+async def get_service_status(service_name: str) -> bool:
+    """وضعیت یک سرویس را برمی‌گرداند (از نسخه درون‌حافظه‌ای)."""
+    return is_service_enabled(service_name)
 
 async def get_all_statuses() -> list[ServiceStatus]:
     """وضعیت تمام سرویس‌ها را به صورت غیرهمزمان برمی‌گرداند."""
@@ -58,5 +70,6 @@ async def toggle_service_status(service_name: str) -> bool | None:
         if service:
             service.is_enabled = not service.is_enabled
             await db.commit()
+            _status_snapshot[service_name] = service.is_enabled
             return service.is_enabled
         return None
\ No newline at end of file
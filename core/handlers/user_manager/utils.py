@@ -1,5 +1,6 @@
 # core/user_manager/utils.py
 from database.models import User
+from core.settings import settings
 
 def can_download(user: User) -> bool:
     """بررسی می‌کند که آیا کاربر مجاز به دانلود است یا خیر."""
@@ -14,7 +15,12 @@ def get_batch_limit(user: User) -> int:
     return limits.get(user.subscription_tier, 1)
 
 def get_file_size_limit(user: User) -> int:
-    """محدودیت حجم فایل کاربر را بر اساس پلن اشتراک او برمی‌گرداند."""
+    """
+    محدودیت حجم فایل کاربر را بر اساس پلن اشتراک او برمی‌گرداند؛ هرگز بیشتر از سقف آپلود
+    Bot API (50 مگابایت عمومی یا 2000 مگابایت با سرور local) نیست.
+    """
     if user.subscription_tier in ['gold', 'diamond']:
-        return 4 * 1024 * 1024 * 1024  # 4 GB
-    return 2 * 1024 * 1024 * 1024  # 2 GB
\ No newline at end of file
+        plan_limit = 4 * 1024 * 1024 * 1024  # 4 GB
+    else:
+        plan_limit = 2 * 1024 * 1024 * 1024  # 2 GB
+    return min(plan_limit, settings.TELEGRAM_UPLOAD_LIMIT)
\ No newline at end of file
@@ -0,0 +1,81 @@
+# core/http_client.py
+
+import logging
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+
+import config
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# خطاهایی که نشان می‌دهند مشکل از پراکسی است، نه از سرور مقصد
+PROXY_ERRORS = (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError)
+
+class HttpClient:
+    """
+    لایه HTTP مشترک کل پردازه روی یک aiohttp.ClientSession.
+    اتصال‌ها (keep-alive) و نتایج DNS بین درخواست‌ها حفظ می‌شوند تا هزینه TLS تنها یک بار
+    پرداخت شود و تعداد اتصال‌های همزمان به هر دامنه محدود بماند.
+    """
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """نشست مشترک را برمی‌گرداند (در اولین استفاده ساخته می‌شود)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_LIMIT,
+                limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            )
+            # total=None تا دانلودهای استریمی طولانی قطع نشوند؛ درخواست‌های کوچک timeout خود را می‌دهند
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def request(self, method: str, url: str, *, use_proxy: bool = False, **kwargs):
+        """
+        context manager درخواست خام (برای دانلود استریمی).
+        در صورت use_proxy یک پراکسی تصادفی از config.get_random_proxy استفاده می‌شود.
+        """
+        proxy = config.get_random_proxy() if use_proxy else None
+        return self.session.request(method, url, proxy=proxy, **kwargs)
+
+    async def _fetch(self, method: str, url: str, reader: Callable[[aiohttp.ClientResponse], Awaitable[Any]],
+                     use_proxy: bool, **kwargs) -> Any:
+        proxy = config.get_random_proxy() if use_proxy else None
+        try:
+            async with self.session.request(method, url, proxy=proxy, **kwargs) as response:
+                response.raise_for_status()
+                result = await reader(response)
+            if proxy:
+                config.report_proxy_success(proxy)
+            return result
+        except PROXY_ERRORS:
+            if proxy:
+                config.handle_proxy_failure(proxy)
+            raise
+
+    async def get_text(self, url: str, *, use_proxy: bool = False, **kwargs) -> str:
+        return await self._fetch('GET', url, lambda r: r.text(), use_proxy, **kwargs)
+
+    async def get_json(self, url: str, *, use_proxy: bool = False, **kwargs) -> Any:
+        return await self._fetch('GET', url, lambda r: r.json(content_type=None), use_proxy, **kwargs)
+
+    async def content_length(self, url: str, *, use_proxy: bool = False, **kwargs) -> int:
+        """حجم فایل را با یک درخواست HEAD (با دنبال کردن ریدایرکت‌ها) برمی‌گرداند."""
+        async def read_length(response: aiohttp.ClientResponse) -> int:
+            return int(response.headers.get('content-length', 0))
+        return await self._fetch('HEAD', url, read_length, use_proxy, allow_redirects=True, **kwargs)
+
+    async def close(self):
+        """نشست مشترک را هنگام خاموش شدن ربات می‌بندد."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+http_client = HttpClient()
@@ -0,0 +1,17 @@
+# core/kv_store.py
+
+import datetime
+
+from database.database import AsyncSessionLocal
+from database.models import KeyValue
+
+async def get_value(key: str) -> KeyValue | None:
+    """رکورد ذخیره شده یک کلید (مقدار و زمان به‌روزرسانی) را برمی‌گرداند."""
+    async with AsyncSessionLocal() as session:
+        return await session.get(KeyValue, key)
+
+async def set_value(key: str, value: str):
+    """مقدار یک کلید را درج یا به‌روزرسانی می‌کند."""
+    async with AsyncSessionLocal() as session:
+        await session.merge(KeyValue(key=key, value=value, updated_at=datetime.datetime.utcnow()))
+        await session.commit()
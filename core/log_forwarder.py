@@ -1,13 +1,39 @@
 # core/log_forwarder.py
-from telegram import Update
-from telegram.ext import ContextTypes
+import asyncio
+import logging
+from telegram import Bot
 from core.settings import settings
 from core.handlers.user_manager import User
+from core.rate_limiter import PRIORITY_BROADCAST
 
-async def forward_download_to_log_channel(context: ContextTypes.DEFAULT_TYPE, user: User, sent_message, service_name, url):
-    """فایل دانلود شده را به کانال لاگ ارسال می‌کند."""
+logger = logging.getLogger(__name__)
+
+# ارجاع به task های در حال اجرا تا پیش از پایان توسط garbage collector حذف نشوند
+_pending_forwards: set[asyncio.Task] = set()
+
+def forward_download_to_log_channel(bot: Bot, user: User, sent_message, service_name, url):
+    """
+    ارسال فایل دانلود شده به کانال لاگ را در پس‌زمینه و با پایین‌ترین اولویت محدودکننده نرخ
+    زمان‌بندی می‌کند تا صف کانال لاگ (20 پیام در دقیقه) خط لوله دانلود را معطل نکند.
+    """
     if not settings.LOG_CHANNEL_ID:
         return
+    task = asyncio.get_running_loop().create_task(_forward(bot, user, sent_message, service_name, url))
+    _pending_forwards.add(task)
+    task.add_done_callback(_pending_forwards.discard)
+
+async def wait_for_pending_forwards(timeout: float):
+    """
+    منتظر ارسال‌های در جریان به کانال لاگ می‌ماند (حداکثر timeout ثانیه). worker های Celery
+    حلقه رویداد را فقط در طول هر وظیفه اجرا می‌کنند و بدون آن ارسال‌ها تا وظیفه بعدی معطل می‌مانند.
+    """
+    if not _pending_forwards:
+        return
+    _, pending = await asyncio.wait(set(_pending_forwards), timeout=timeout)
+    if pending:
+        logger.warning(f"{len(pending)} log channel forward(s) still pending after {timeout}s.")
+
+async def _forward(bot: Bot, user: User, sent_message, service_name, url):
 
     caption = (
         f"**📥 گزارش دانلود**\n\n"
@@ -18,19 +44,21 @@ async def forward_download_to_log_channel(context: ContextTypes.DEFAULT_TYPE, us
 
     try:
         if sent_message.audio:
-            await context.bot.send_audio(
+            await bot.send_audio(
                 chat_id=settings.LOG_CHANNEL_ID,
                 audio=sent_message.audio.file_id,
                 caption=caption,
-                parse_mode='Markdown'
+                parse_mode='Markdown',
+                rate_limit_args={'priority': PRIORITY_BROADCAST},
             )
         elif sent_message.video:
-            await context.bot.send_video(
+            await bot.send_video(
                 chat_id=settings.LOG_CHANNEL_ID,
                 video=sent_message.video.file_id,
                 caption=caption,
-                parse_mode='Markdown'
+                parse_mode='Markdown',
+                rate_limit_args={'priority': PRIORITY_BROADCAST},
             )
     except Exception as e:
         # Avoid crashing the main process if logging fails
-        print(f"Failed to forward download to log channel: {e}")
\ No newline at end of file
+        logger.warning(f"Failed to forward download to log channel: {e}")
\ No newline at end of file
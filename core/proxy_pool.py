@@ -0,0 +1,172 @@
+# core/proxy_pool.py
+
+import math
+import time
+import heapq
+import random
+import logging
+from typing import Collection
+
+logger = logging.getLogger(__name__)
+
+# وزن هر نتیجه جدید در میانگین متحرک سلامت و تاخیر
+HEALTH_ALPHA = 0.3
+LATENCY_ALPHA = 0.3
+# سلامت بدون تست جدید با این نیمه‌عمر (ثانیه) به سمت مقدار خنثی برمی‌گردد
+HEALTH_HALF_LIFE = 1800
+NEUTRAL_HEALTH = 0.5
+# پراکسی پس از این تعداد خطای پشت سر هم از استخر حذف می‌شود
+MAX_CONSECUTIVE_FAILURES = 3
+# جلوگیری از وزن بی‌نهایت برای پراکسی‌های بسیار سریع
+LATENCY_FLOOR = 0.05
+# سلامت فرضی پراکسی برای سرویسی که هنوز روی آن تست نشده (کمتر از پراکسی‌های تایید شده)
+UNKNOWN_TARGET_HEALTH = 0.3
+# پراکسی‌هایی با سلامت کمتر از این مقدار برای یک سرویس، برای آن انتخاب نمی‌شوند
+BLOCKED_TARGET_HEALTH = 0.2
+# پراکسی‌هایی که هنوز روی هیچ سرویسی تست نشده‌اند در بازبینی این مقدار (ثانیه) قدیمی‌تر فرض می‌شوند
+UNPROBED_PRIORITY = 3600
+
+class ProxyStats:
+    """تاریخچه فشرده یک پراکسی: تاخیر، نرخ موفقیت، سلامت برای هر سرویس و زمان آخرین استفاده."""
+    __slots__ = ('proxy', 'latency', 'health', 'successes', 'failures',
+                 'consecutive_failures', 'last_used', 'updated_at', 'checked_at', 'targets')
+
+    def __init__(self, proxy: str, latency: float):
+        self.proxy = proxy
+        self.latency = latency
+        self.health = 1.0
+        self.successes = 1
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_used = 0.0
+        self.updated_at = time.time()
+        # زمان آخرین تست فعال (نه استفاده عادی)؛ بازبینی تدریجی از قدیمی‌ترین‌ها شروع می‌کند
+        self.checked_at = self.updated_at
+        # سلامت پراکسی برای هر سرویس مقصد (نام سرویس ← میانگین متحرک نتایج)
+        self.targets: dict[str, float] = {}
+
+    def current_health(self, now: float) -> float:
+        """سلامت با گذشت زمان از آخرین نتیجه به سمت مقدار خنثی میل می‌کند."""
+        decay = math.pow(0.5, (now - self.updated_at) / HEALTH_HALF_LIFE)
+        return NEUTRAL_HEALTH + (self.health - NEUTRAL_HEALTH) * decay
+
+    def score(self, now: float) -> float:
+        return self.current_health(now) / max(self.latency, LATENCY_FLOOR)
+
+    def target_weight(self, target: str, now: float) -> float:
+        health = self.targets.get(target)
+        if health is None:
+            health = UNKNOWN_TARGET_HEALTH
+        elif health < BLOCKED_TARGET_HEALTH:
+            return 0.0
+        return health * self.score(now)
+
+    def update_target(self, target: str, ok: bool):
+        previous = self.targets.get(target, NEUTRAL_HEALTH)
+        self.targets[target] = previous * (1 - HEALTH_ALPHA) + (HEALTH_ALPHA if ok else 0.0)
+
+class ProxyPool:
+    """
+    استخر پراکسی‌های معتبر با امتیازدهی بر اساس تاخیر و سابقه موفقیت.
+    انتخاب به صورت تصادفی وزن‌دار انجام می‌شود تا پراکسی‌های سریع و سالم بیشتر استفاده شوند،
+    اما بقیه هم گاهی انتخاب شوند و سابقه آن‌ها به‌روز بماند.
+    """
+    def __init__(self):
+        self._proxies: dict[str, ProxyStats] = {}
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    def __contains__(self, proxy: str) -> bool:
+        return proxy in self._proxies
+
+    def add(self, proxy: str, latency: float):
+        """یک پراکسی تست شده را اضافه یا نتیجه تست آن را ثبت می‌کند."""
+        stats = self._proxies.get(proxy)
+        if stats is None:
+            self._proxies[proxy] = ProxyStats(proxy, latency)
+        else:
+            self.record_success(proxy, latency)
+            stats.checked_at = stats.updated_at
+
+    def restore(self, records: list[ProxyStats]):
+        """سابقه ذخیره شده پراکسی‌ها را (مثلاً از دیتابیس پس از راه‌اندازی مجدد) بارگذاری می‌کند."""
+        for stats in records:
+            self._proxies.setdefault(stats.proxy, stats)
+
+    def snapshot(self) -> list[ProxyStats]:
+        return list(self._proxies.values())
+
+    def stalest(self, count: int) -> list[str]:
+        """پراکسی‌هایی که بیشترین زمان از آخرین تست آن‌ها گذشته است."""
+        def age_key(s: ProxyStats) -> float:
+            return s.checked_at if s.targets else s.checked_at - UNPROBED_PRIORITY
+        return [s.proxy for s in heapq.nsmallest(count, self._proxies.values(), key=age_key)]
+
+    def choose(self, target: str | None = None, exclude: Collection[str] = ()) -> str | None:
+        """
+        یک پراکسی را با احتمال متناسب با امتیاز آن انتخاب می‌کند. با target، پراکسی‌هایی که برای
+        آن سرویس تایید شده‌اند ترجیح داده می‌شوند و پراکسی‌های مسدود شده انتخاب نمی‌شوند.
+        پراکسی‌های exclude (مثلاً تلاش‌های ناموفق قبلی) انتخاب نمی‌شوند.
+        """
+        candidates = [s for s in self._proxies.values() if s.proxy not in exclude]
+        if not candidates:
+            return None
+        now = time.time()
+        weights = [s.target_weight(target, now) if target else s.score(now) for s in candidates]
+        if not any(weights):
+            # هیچ پراکسی سالمی برای این سرویس شناخته نشده است
+            weights = [s.score(now) for s in candidates]
+        stats = random.choices(candidates, weights=weights)[0]
+        stats.last_used = now
+        return stats.proxy
+
+    def record_probe(self, proxy: str, target: str, ok: bool):
+        """نتیجه تست پراکسی روی یک سرویس مقصد را ثبت می‌کند (سلامت عمومی تغییر نمی‌کند)."""
+        stats = self._proxies.get(proxy)
+        if stats is not None:
+            stats.update_target(target, ok)
+
+    def record_success(self, proxy: str, latency: float | None = None, target: str | None = None):
+        stats = self._proxies.get(proxy)
+        if stats is None:
+            return
+        if target:
+            stats.update_target(target, True)
+        now = time.time()
+        stats.health = stats.current_health(now) * (1 - HEALTH_ALPHA) + HEALTH_ALPHA
+        if latency is not None:
+            stats.latency = stats.latency * (1 - LATENCY_ALPHA) + latency * LATENCY_ALPHA
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.updated_at = now
+
+    def record_failure(self, proxy: str, checked: bool = False, target: str | None = None) -> bool:
+        """امتیاز پراکسی را کاهش می‌دهد؛ پس از چند خطای پشت سر هم حذف شده و True برمی‌گرداند."""
+        stats = self._proxies.get(proxy)
+        if stats is None:
+            return False
+        if target:
+            stats.update_target(target, False)
+        now = time.time()
+        stats.health = stats.current_health(now) * (1 - HEALTH_ALPHA)
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        stats.updated_at = now
+        if checked:
+            stats.checked_at = now
+        if stats.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            del self._proxies[proxy]
+            return True
+        return False
+
+    def clear(self):
+        self._proxies.clear()
+
+    def stats(self) -> dict:
+        if not self._proxies:
+            return {'size': 0, 'median_latency': None}
+        latencies = sorted(s.latency for s in self._proxies.values())
+        return {'size': len(latencies), 'median_latency': round(latencies[len(latencies) // 2], 3)}
+
+proxy_pool = ProxyPool()
@@ -0,0 +1,148 @@
+# core/proxy_retry.py
+"""
+سیاست مشترک تلاش مجدد برای کارهای yt-dlp که از پراکسی استفاده می‌کنند.
+خطاها به دو دسته تقسیم می‌شوند: خطای پراکسی/شبکه (و محدودیت جغرافیایی) که با پراکسی دیگر
+(یا اتصال مستقیم) دوباره امتحان می‌شود، و خطای خود محتوا (خصوصی، حذف شده و ...) که بلافاصله برگردانده می‌شود.
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Callable, TypeVar
+
+from yt_dlp.utils import GeoRestrictedError
+
+import config
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# عبارت‌هایی در پیام خطای yt-dlp که نشان می‌دهند مشکل از خود محتواست، نه از شبکه یا پراکسی
+UNAVAILABLE_MARKERS = (
+    'private', 'unavailable', 'not available', 'removed', 'deleted',
+    'does not exist', 'no longer exists', 'copyright', 'http error 404',
+)
+
+# عبارت‌هایی که نشان می‌دهند محتوا فقط در منطقه IP فعلی مسدود است (GeoRestrictedError در yt-dlp)
+GEO_MARKERS = (
+    'in your country', 'from your location', 'geo restrict', 'geo-restrict',
+    'not available in your region', 'blocked it in your',
+)
+
+# عبارت‌هایی که نشان می‌دهند اتصال (معمولاً پراکسی) مشکل دارد یا IP آن مسدود شده است
+PROXY_ERROR_MARKERS = (
+    'proxy', 'tunnel', 'timed out', 'connection reset', 'connection refused', 'connection aborted',
+    'remote end closed', 'unable to connect', 'eof occurred', 'ssl', 'name resolution',
+    'http error 403', 'http error 407', 'http error 429', 'not a bot',
+)
+
+def is_geo_restricted_error(error: BaseException) -> bool:
+    """بررسی می‌کند که آیا محتوا فقط برای کشور/منطقه IP فعلی در دسترس نیست."""
+    if isinstance(getattr(error, 'exc_info', None), tuple) and isinstance(error.exc_info[1], GeoRestrictedError):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in GEO_MARKERS)
+
+def is_content_unavailable_error(error: Exception) -> bool:
+    """
+    بررسی می‌کند که آیا خطای yt-dlp مربوط به در دسترس نبودن خود محتواست.
+    محدودیت جغرافیایی جزو آن نیست چون با پراکسی یا مسیر خروجی دیگر ممکن است برطرف شود.
+    """
+    if is_geo_restricted_error(error):
+        return False
+    message = str(error).lower()
+    return 'proxy' not in message and any(marker in message for marker in UNAVAILABLE_MARKERS)
+
+def is_proxy_error(error: BaseException) -> bool:
+    """بررسی می‌کند که آیا خطا احتمالاً از پراکسی/شبکه است و تلاش با مسیر دیگر ارزش دارد."""
+    if is_geo_restricted_error(error):
+        return True
+    if is_content_unavailable_error(error):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in PROXY_ERROR_MARKERS)
+
+async def _attempt(func: Callable[[str | None], T], proxy: str | None, target: str | None,
+                   executor: Executor | None) -> T:
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(executor, func, proxy)
+    except Exception as e:
+        # محدودیت جغرافیایی به خود محتوا مربوط است و سلامت پراکسی را کم نمی‌کند
+        if proxy and is_proxy_error(e) and not is_geo_restricted_error(e):
+            config.handle_proxy_failure(proxy, target=target)
+        raise
+    if proxy:
+        config.report_proxy_success(proxy, target=target)
+    return result
+
+async def run_with_failover(func: Callable[[str | None], T], *, target: str | None, deadline: float,
+                            executor: Executor | None = None, max_attempts: int | None = None,
+                            hedge_delay: float = 0.0, enforce_deadline: bool = True) -> T:
+    """
+    func(proxy) را در executor اجرا می‌کند و در صورت خطای پراکسی، با پراکسی دیگری از استخر
+    (و در آخرین تلاش با اتصال مستقیم) دوباره امتحان می‌کند.
+
+    - پس از گذشت deadline ثانیه تلاش جدیدی شروع نمی‌شود؛ با enforce_deadline تلاش در حال اجرا
+      هم رها شده و asyncio.TimeoutError ایجاد می‌شود (فقط برای کارهایی که نتیجه آن‌ها قابل دور ریختن است).
+    - با hedge_delay، اگر تلاش اول تا آن زمان تمام نشود، پراکسی دوم به صورت موازی امتحان
+      شده و اولین نتیجه موفق برگردانده می‌شود.
+    خطای محتوا (یا هر خطای غیر پراکسی) بدون تلاش مجدد دوباره ایجاد می‌شود.
+    """
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + deadline
+    max_attempts = max_attempts or settings.PROXY_MAX_ATTEMPTS
+    tried: list[str | None] = []
+    pending: set[asyncio.Task] = set()
+    last_error: BaseException | None = None
+
+    def can_launch() -> bool:
+        # پس از تلاش مستقیم مسیر دیگری باقی نمانده است
+        return len(tried) < max_attempts and None not in tried and loop.time() < ends_at
+
+    def launch():
+        if settings.PROXY_DIRECT_FALLBACK and len(tried) == max_attempts - 1:
+            proxy = None
+        else:
+            proxy = config.get_random_proxy(target=target, exclude=tried)
+        if tried:
+            logger.info(f"Retrying {target or 'request'} via {proxy or 'direct connection'} "
+                        f"(attempt {len(tried) + 1}/{max_attempts}).")
+        tried.append(proxy)
+        pending.add(asyncio.ensure_future(_attempt(func, proxy, target, executor)))
+
+    launch()
+    try:
+        while pending:
+            timeout = hedge_delay if hedge_delay and len(pending) == 1 and can_launch() else None
+            if enforce_deadline:
+                remaining = max(ends_at - loop.time(), 0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+
+            if not done:
+                if enforce_deadline and loop.time() >= ends_at:
+                    break
+                if can_launch():
+                    launch()
+                continue
+
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return task.result()
+                if not is_proxy_error(error):
+                    raise error
+                last_error = error
+            if not pending and can_launch():
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if pending:
+        raise asyncio.TimeoutError(f"No attempt finished within {deadline}s (tried {len(tried)} routes).")
+    raise last_error
@@ -0,0 +1,218 @@
+# core/rate_limiter.py
+"""
+محدودکننده نرخ درخواست‌های خروجی ربات مطابق محدودیت‌های تلگرام (حدود 30 پیام در ثانیه در کل،
+یک پیام در ثانیه برای هر چت خصوصی و 20 پیام در دقیقه برای هر گروه).
+درخواست‌ها بر اساس اولویت صف می‌شوند: پاسخ به کاربر، سپس ویرایش پیشرفت دانلود و در آخر ارسال همگانی.
+اولویت با rate_limit_args={'priority': ...} به متدهای ربات داده می‌شود.
+"""
+import asyncio
+import datetime
+import logging
+from collections import deque
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from core.cache import TTLCache
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_PROGRESS = 1
+PRIORITY_BROADCAST = 2
+PRIORITY_NAMES = {PRIORITY_REPLY: 'reply', PRIORITY_PROGRESS: 'progress', PRIORITY_BROADCAST: 'broadcast'}
+
+# سطل‌های چت‌هایی که مدتی پیامی نداشته‌اند پس از این مدت (ثانیه) حذف می‌شوند
+CHAT_BUCKET_TTL = 600
+
+class TokenBucket:
+    """سطل توکن ساده: rate توکن در ثانیه و حداکثر capacity توکن ذخیره."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        # پس از RetryAfter تا این زمان هیچ درخواستی ارسال نمی‌شود
+        self.paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """مدت انتظار (ثانیه) تا در دسترس بودن یک توکن؛ صفر یعنی همین حالا."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = 0
+
+class _Pending:
+    __slots__ = ('chat_id', 'priority', 'future')
+
+    def __init__(self, chat_id: int | str | None, priority: int, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.future = future
+
+class PriorityRateLimiter(BaseRateLimiter[dict]):
+    """
+    درخواست‌ها را پیش از ارسال در صف‌های اولویت‌دار نگه می‌دارد و با یک سطل سراسری و یک سطل
+    برای هر چت آزاد می‌کند. چتی که به سقف خود رسیده، صف بقیه چت‌ها را مسدود نمی‌کند.
+    درخواست‌هایی که به چت خاصی ارسال نمی‌شوند (answer_callback_query، get_file و ...) محدود نمی‌شوند.
+    در صورت RetryAfter، ارسال به همان چت (یا در نبود چت، کل ارسال‌ها) متوقف و درخواست دوباره صف می‌شود.
+    """
+    def __init__(self, overall_rate: float, chat_rate: float, chat_burst: float,
+                 group_rate: float, max_retries: int):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._queues: dict[int, deque[_Pending]] = {p: deque() for p in PRIORITY_NAMES}
+        self._chats = TTLCache('rate_limit_chats', 100_000, CHAT_BUCKET_TTL)
+        self._global: TokenBucket | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._sent = 0
+        self._retries = 0
+
+    async def initialize(self) -> None:
+        if self._dispatcher is None:
+            loop = asyncio.get_running_loop()
+            self._global = TokenBucket(self.overall_rate, self.overall_rate, loop.time())
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for queue in self._queues.values():
+            while queue:
+                queue.popleft().future.cancel()
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id, count=False)
+        if bucket is None:
+            # شناسه‌های منفی (گروه‌ها و کانال‌ها) محدودیت دقیقه‌ای سخت‌تری دارند
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, 1 if is_group else self.chat_burst, now)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    def _next_ready(self, now: float) -> tuple[_Pending | None, float | None]:
+        """اولین درخواست (به ترتیب اولویت) که چت آن آماده است، یا کمترین زمان انتظار."""
+        min_wait = None
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            for index, pending in enumerate(queue):
+                if pending.future.done():
+                    continue
+                wait = self._chat_bucket(pending.chat_id, now).delay(now)
+                if wait <= 0:
+                    del queue[index]
+                    return pending, None
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def _drop_cancelled(self):
+        for queue in self._queues.values():
+            while queue and queue[0].future.done():
+                queue.popleft()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._drop_cancelled()
+            now = loop.time()
+            wait = None
+            if any(self._queues.values()):
+                wait = self._global.delay(now)
+                if wait <= 0:
+                    pending, wait = self._next_ready(now)
+                    if pending is not None:
+                        self._global.consume()
+                        self._chat_bucket(pending.chat_id, now).consume()
+                        pending.future.set_result(None)
+                        continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _acquire(self, chat_id: int | str, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(_Pending(chat_id, priority, future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: dict | None,
+    ) -> bool | dict | list[dict]:
+        chat_id = data.get('chat_id')
+        priority = (rate_limit_args or {}).get('priority', PRIORITY_REPLY)
+        if priority not in self._queues:
+            priority = PRIORITY_REPLY
+
+        retries = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+                self._sent += 1
+                return result
+            except RetryAfter as e:
+                retries += 1
+                if retries > self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                delay = retry_after.total_seconds() if isinstance(retry_after, datetime.timedelta) else float(retry_after)
+                now = asyncio.get_running_loop().time()
+                bucket = self._chat_bucket(chat_id, now) if chat_id is not None else self._global
+                bucket.pause(now + delay)
+                self._retries += 1
+                logger.warning(f"Flood control on {endpoint} (chat {chat_id}); retrying in {delay:.0f}s.")
+                if chat_id is None:
+                    await asyncio.sleep(delay)
+                self._wakeup.set()
+
+    def stats(self) -> dict:
+        """عمق صف هر اولویت و آمار کلی ارسال‌ها."""
+        return {
+            'queued': {PRIORITY_NAMES[p]: sum(not x.future.done() for x in q) for p, q in self._queues.items()},
+            'chats': len(self._chats),
+            'sent': self._sent,
+            'retries': self._retries,
+        }
+
+def log_rate_limiter_stats() -> None:
+    """آمار محدودکننده نرخ را در لاگ ثبت می‌کند."""
+    stats = rate_limiter.stats()
+    queued = ' '.join(f"{name}={depth}" for name, depth in stats['queued'].items())
+    logger.info(f"Rate limiter: queued {queued} chats={stats['chats']} sent={stats['sent']} retries={stats['retries']}")
+
+# سطل سراسری مختص همین پردازه است؛ سهم هر پردازه از سقف کل ربات برابر است
+rate_limiter = PriorityRateLimiter(
+    overall_rate=settings.RATE_LIMIT_OVERALL / settings.RATE_LIMIT_PROCESSES,
+    chat_rate=settings.RATE_LIMIT_PER_CHAT,
+    chat_burst=settings.RATE_LIMIT_CHAT_BURST,
+    group_rate=settings.RATE_LIMIT_PER_GROUP,
+    max_retries=settings.RATE_LIMIT_MAX_RETRIES,
+)
@@ -0,0 +1,150 @@
+# core/request_state.py
+"""
+وضعیت درخواست‌های دانلود: درخواست‌های آماده تایید، پرچم‌های لغو، آدرس‌های کوتاه شده
+و شناسه task های Celery. همه ورودی‌ها منقضی می‌شوند و تعدادشان محدود است.
+پیاده‌سازی حافظه‌ای (پیش‌فرض) یا Redis با REQUEST_STATE_BACKEND انتخاب می‌شود.
+همه متدها فقط از حلقه رویداد فراخوانی می‌شوند؛ thread های دانلود پرچم لغو را از
+نسخه محلی که downloader_general به صورت دوره‌ای به‌روز می‌کند می‌خوانند.
+"""
+import json
+import logging
+
+from core.cache import TTLCache
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class DownloadRequest:
+    """یک درخواست دانلود آماده شده که منتظر تایید کاربر است."""
+    __slots__ = ('service', 'quality', 'resource_id', 'user_id', 'caption')
+
+    def __init__(self, service: str, quality: str, resource_id: str, user_id: int, caption: str | None):
+        self.service = service
+        self.quality = quality
+        self.resource_id = resource_id
+        self.user_id = user_id
+        self.caption = caption
+
+    def to_dl_info(self) -> dict:
+        """دیکشنری مورد استفاده خط لوله دانلود را می‌سازد."""
+        return {
+            'service': self.service, 'quality': self.quality, 'resource_id': self.resource_id,
+            'user_id': self.user_id, 'original_message_caption': self.caption,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps([self.service, self.quality, self.resource_id, self.user_id, self.caption])
+
+    @classmethod
+    def from_json(cls, raw: str) -> "DownloadRequest":
+        return cls(*json.loads(raw))
+
+class MemoryRequestState:
+    """وضعیت درخواست‌ها در حافظه همین پردازه (روی TTLCache ها و پاکسازی دوره‌ای sweep_caches)."""
+    name = 'memory'
+
+    def __init__(self, max_size: int, request_ttl: float, cancel_ttl: float):
+        self._requests = TTLCache('download_requests', max_size, request_ttl)
+        self._cancelled = TTLCache('cancelled_tasks', max_size, cancel_ttl)
+        self._urls = TTLCache('download_urls', max_size, request_ttl)
+        self._task_ids = TTLCache('celery_task_ids', max_size, cancel_ttl)
+
+    async def put_request(self, key: str, request: DownloadRequest):
+        self._requests.set(key, request)
+
+    async def get_request(self, key: str) -> DownloadRequest | None:
+        return self._requests.get(key)
+
+    async def pop_request(self, key: str) -> DownloadRequest | None:
+        return self._requests.pop(key)
+
+    async def set_cancelled(self, key: str, cancelled: bool):
+        self._cancelled.set(key, cancelled)
+
+    async def is_cancelled(self, key: str) -> bool:
+        return bool(self._cancelled.get(key, False, count=False))
+
+    async def clear_cancel_flag(self, key: str):
+        # پرچم لغو باقی می‌ماند تا thread در حال اجرای yt-dlp هم متوقف شود
+        if not await self.is_cancelled(key):
+            self._cancelled.pop(key)
+
+    async def put_url(self, short_key: str, url: str):
+        self._urls.set(short_key, url)
+
+    async def get_url(self, short_key: str) -> str | None:
+        return self._urls.get(short_key)
+
+    async def put_task_id(self, key: str, task_id: str):
+        self._task_ids.set(key, task_id)
+
+    async def pop_task_id(self, key: str) -> str | None:
+        return self._task_ids.pop(key)
+
+class RedisRequestState:
+    """
+    وضعیت درخواست‌ها در Redis تا پس از راه‌اندازی مجدد باقی بماند و بین چند نمونه ربات
+    و worker های Celery مشترک باشد. انقضا توسط TTL خود Redis انجام می‌شود.
+    """
+    name = 'redis'
+
+    def __init__(self, url: str, request_ttl: float, cancel_ttl: float, prefix: str = 'mdb'):
+        import redis.asyncio as redis
+        # عملیات‌ها کوچک هستند و timeout کوتاه از انتظار طولانی handler ها جلوگیری می‌کند
+        self._redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2, socket_connect_timeout=2)
+        self.request_ttl = int(request_ttl)
+        self.cancel_ttl = int(cancel_ttl)
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def _pop(self, key: str) -> str | None:
+        async with self._redis.pipeline() as pipe:
+            pipe.get(key)
+            pipe.delete(key)
+            value, _ = await pipe.execute()
+        return value
+
+    async def put_request(self, key: str, request: DownloadRequest):
+        await self._redis.set(self._key('req', key), request.to_json(), ex=self.request_ttl)
+
+    async def get_request(self, key: str) -> DownloadRequest | None:
+        raw = await self._redis.get(self._key('req', key))
+        return DownloadRequest.from_json(raw) if raw else None
+
+    async def pop_request(self, key: str) -> DownloadRequest | None:
+        raw = await self._pop(self._key('req', key))
+        return DownloadRequest.from_json(raw) if raw else None
+
+    async def set_cancelled(self, key: str, cancelled: bool):
+        await self._redis.set(self._key('cancel', key), '1' if cancelled else '0', ex=self.cancel_ttl)
+
+    async def is_cancelled(self, key: str) -> bool:
+        return await self._redis.get(self._key('cancel', key)) == '1'
+
+    async def clear_cancel_flag(self, key: str):
+        if not await self.is_cancelled(key):
+            await self._redis.delete(self._key('cancel', key))
+
+    async def put_url(self, short_key: str, url: str):
+        await self._redis.set(self._key('url', short_key), url, ex=self.request_ttl)
+
+    async def get_url(self, short_key: str) -> str | None:
+        return await self._redis.get(self._key('url', short_key))
+
+    async def put_task_id(self, key: str, task_id: str):
+        await self._redis.set(self._key('task', key), task_id, ex=self.cancel_ttl)
+
+    async def pop_task_id(self, key: str) -> str | None:
+        return await self._pop(self._key('task', key))
+
+def get_request_state():
+    """پیاده‌سازی وضعیت درخواست‌ها را بر اساس تنظیمات REQUEST_STATE_BACKEND برمی‌گرداند."""
+    if settings.REQUEST_STATE_BACKEND == 'redis':
+        return RedisRequestState(settings.REDIS_URL, settings.REQUEST_STATE_TTL, settings.CANCEL_FLAG_TTL)
+    if settings.REQUEST_STATE_BACKEND != 'memory':
+        logger.warning(f"Unknown REQUEST_STATE_BACKEND '{settings.REQUEST_STATE_BACKEND}', falling back to memory.")
+    return MemoryRequestState(settings.REQUEST_STATE_MAX_SIZE, settings.REQUEST_STATE_TTL, settings.CANCEL_FLAG_TTL)
+
+request_state = get_request_state()
@@ -0,0 +1,37 @@
+# core/result_store.py
+
+from typing import Iterable
+
+from core.cache import TTLCache
+from core.settings import settings
+
+# هر ورودی تنها (شناسه، عنوان) است؛ همان چیزی که دکمه‌های صفحه‌بندی نیاز دارند
+ResultItem = tuple[str, str]
+
+EXPIRED_LIST_TEXT = "⌛️ این لیست منقضی شده است؛ لطفاً لینک را دوباره ارسال کنید."
+
+class ResultStore:
+    """
+    نگهداری موقت لیست نتایج صفحه‌بندی شده (پلی‌لیست‌های کانال، قسمت‌های پادکست و ...).
+    هر لیست به یک پیام ربات گره خورده و پس از TTL یا با رسیدن به سقف تعداد حذف می‌شود.
+    """
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self._cache = TTLCache(name, max_size, ttl)
+
+    @staticmethod
+    def make_key(kind: str, chat_id: int, message_id: int) -> str:
+        return f"{kind}:{chat_id}:{message_id}"
+
+    def put(self, key: str, entries: Iterable[dict], id_field: str = 'id', title_field: str = 'title') -> tuple[ResultItem, ...]:
+        """فقط شناسه و عنوان هر ورودی را ذخیره کرده و لیست فشرده را برمی‌گرداند."""
+        items = tuple(
+            (str(entry[id_field]), str(entry.get(title_field) or entry[id_field]))
+            for entry in entries if entry and entry.get(id_field)
+        )
+        self._cache.set(key, items)
+        return items
+
+    def get(self, key: str) -> tuple[ResultItem, ...] | None:
+        return self._cache.get(key)
+
+result_store = ResultStore('pagination_results', settings.RESULT_STORE_MAX_SIZE, settings.RESULT_STORE_TTL)
@@ -6,6 +6,11 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from database.database import AsyncSessionLocal
 from core.handlers import user_manager
+from core.cache import log_cache_stats, sweep_caches
+from core.rate_limiter import log_rate_limiter_stats
+from core.handlers.service_manager import reload_service_statuses
+from core.settings import settings
+from services.soundcloud import SoundCloudService, CLIENT_ID_TTL, CLIENT_ID_REFRESH_MARGIN
 
 logger = logging.getLogger(__name__)
 
@@ -56,10 +61,26 @@ async def send_daily_report(application: Application):
     logger.info("آمار دانلود روزانه تمام کاربران ریست شد.", extra=extra_log_info)
 
 
-def setup_scheduler(application: Application):
-    """زمان‌بند را برای اجرای وظایف روزانه تنظیم می‌کند."""
+async def refresh_soundcloud_client_id():
+    """client_id ساندکلاد را پیش از انقضا تمدید می‌کند تا هیچ درخواست کاربری منتظر استخراج آن نماند."""
+    await SoundCloudService().refresh_client_id(max_age=CLIENT_ID_TTL - CLIENT_ID_REFRESH_MARGIN)
+
+
+def setup_scheduler(application: Application, primary: bool = True):
+    """
+    زمان‌بند را برای اجرای وظایف روزانه تنظیم می‌کند.
+    با primary=False (replica ها) وظایف سراسری مثل گزارش روزانه اضافه نمی‌شوند تا تکراری اجرا نشوند.
+    """
     scheduler = AsyncIOScheduler(timezone="Asia/Tehran")
-    scheduler.add_job(send_daily_report, 'cron', hour=23, minute=59, args=[application])
+    if primary:
+        scheduler.add_job(send_daily_report, 'cron', hour=23, minute=59, args=[application])
+    scheduler.add_job(log_cache_stats, 'interval', hours=1)
+    scheduler.add_job(log_rate_limiter_stats, 'interval', minutes=5)
+    scheduler.add_job(sweep_caches, 'interval', minutes=10)
+    scheduler.add_job(refresh_soundcloud_client_id, 'interval', minutes=5)
+    if settings.BOT_REPLICAS > 1:
+        # تغییر وضعیت سرویس‌ها توسط ادمین فقط در replica دریافت کننده آن اعمال می‌شود
+        scheduler.add_job(reload_service_statuses, 'interval', minutes=1)
     scheduler.start()
     logger.info("زمان‌بند (Scheduler) با موفقیت برای ساعت ۲۳:۵۹ تنظیم شد.")
     return scheduler
\ No newline at end of file
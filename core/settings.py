@@ -1,6 +1,7 @@
 # core/settings.py
 
 import os
+import hashlib
 from dotenv import load_dotenv
 
 # بارگذاری متغیرهای محیطی از فایل .env
@@ -32,6 +33,89 @@ class Settings:
     INSTAGRAM_USERNAME: str | None
     INSTAGRAM_PASSWORD: str | None
 
+    # In-memory cache configuration
+    FILE_CACHE_MAX_SIZE: int
+    FILE_CACHE_TTL: int
+    NEGATIVE_CACHE_MAX_SIZE: int
+    NEGATIVE_CACHE_TTL: int
+    NEGATIVE_CACHE_GEO_TTL: int
+    SHORT_LINK_CACHE_MAX_SIZE: int
+    SHORT_LINK_CACHE_TTL: int
+    CASTBOX_CACHE_MAX_SIZE: int
+    CASTBOX_CACHE_TTL: int
+    RESULT_STORE_MAX_SIZE: int
+    RESULT_STORE_TTL: int
+
+    # Download worker pool
+    DOWNLOAD_WORKERS: int
+    DOWNLOAD_BACKEND: str
+    CELERY_BROKER_URL: str
+
+    # Download request state (core/request_state.py)
+    REQUEST_STATE_BACKEND: str
+    REDIS_URL: str
+    REQUEST_STATE_MAX_SIZE: int
+    REQUEST_STATE_TTL: int
+    CANCEL_FLAG_TTL: int
+
+    # Update ingress: polling, webhook or replica (bot/webhook.py)
+    BOT_MODE: str
+    WEBHOOK_URL: str | None
+    WEBHOOK_LISTEN: str
+    WEBHOOK_PORT: int
+    WEBHOOK_PATH: str
+    WEBHOOK_SECRET: str
+    WEBHOOK_MAX_CONNECTIONS: int
+    BOT_REPLICAS: int
+    BOT_REPLICA_INDEX: int
+    SHARED_STATE_BACKEND: str
+    SHARED_LOCK_TTL: int
+
+    # Self-hosted Telegram Bot API server (bot/request.py)
+    TELEGRAM_API_BASE_URL: str | None
+    TELEGRAM_API_BASE_FILE_URL: str | None
+    TELEGRAM_LOCAL_MODE: bool
+    TELEGRAM_UPLOAD_LIMIT: int
+
+    # Telegram Bot API connection pools (bot/request.py)
+    TG_HTTP_VERSION: str
+    TG_CONNECT_TIMEOUT: float
+    TG_POOL_TIMEOUT: float
+    TG_CONTROL_POOL_SIZE: int
+    TG_CONTROL_READ_TIMEOUT: float
+    TG_MEDIA_POOL_SIZE: int
+    TG_MEDIA_READ_TIMEOUT: float
+    TG_MEDIA_WRITE_TIMEOUT: float
+    TG_UPDATES_READ_TIMEOUT: float
+
+    # Outbound rate limiting (core/rate_limiter.py)
+    RATE_LIMIT_OVERALL: float
+    RATE_LIMIT_PER_CHAT: float
+    RATE_LIMIT_CHAT_BURST: float
+    RATE_LIMIT_PER_GROUP: float
+    RATE_LIMIT_MAX_RETRIES: int
+    RATE_LIMIT_PROCESSES: int
+
+    # Concurrent update processing (bot/update_processor.py)
+    MAX_CONCURRENT_UPDATES: int
+    MAX_PENDING_UPDATES: int
+
+    # Batch link dispatch
+    BATCH_CONCURRENCY_PER_USER: int
+    BATCH_CONCURRENCY_PER_SERVICE: int
+
+    # Shared HTTP client (core/http_client.py)
+    HTTP_POOL_LIMIT: int
+    HTTP_POOL_LIMIT_PER_HOST: int
+    HTTP_DNS_CACHE_TTL: int
+    HTTP_KEEPALIVE_TIMEOUT: int
+
+    # Proxy retry/failover (core/proxy_retry.py)
+    PROXY_MAX_ATTEMPTS: int
+    PROXY_DIRECT_FALLBACK: bool
+    EXTRACT_DEADLINE: float
+    EXTRACT_HEDGE_DELAY: float
+    DOWNLOAD_RETRY_DEADLINE: float
 
     def __init__(self):
         # --- اعتبارسنجی و بارگذاری متغیرهای ضروری ---
@@ -61,5 +145,113 @@ class Settings:
         self.INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME")
         self.INSTAGRAM_PASSWORD = os.getenv("INSTAGRAM_PASSWORD")
 
+        # --- تنظیمات کش درون‌حافظه‌ای (اندازه بر حسب تعداد ورودی و TTL بر حسب ثانیه) ---
+        self.FILE_CACHE_MAX_SIZE = int(os.getenv("FILE_CACHE_MAX_SIZE", "5000"))
+        self.FILE_CACHE_TTL = int(os.getenv("FILE_CACHE_TTL", "21600"))
+        self.NEGATIVE_CACHE_MAX_SIZE = int(os.getenv("NEGATIVE_CACHE_MAX_SIZE", "2000"))
+        self.NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "600"))
+        # خطای محدودیت جغرافیایی با پراکسی دیگر ممکن است برطرف شود و مدت کوتاه‌تری کش می‌شود
+        self.NEGATIVE_CACHE_GEO_TTL = int(os.getenv("NEGATIVE_CACHE_GEO_TTL", "60"))
+        self.SHORT_LINK_CACHE_MAX_SIZE = int(os.getenv("SHORT_LINK_CACHE_MAX_SIZE", "5000"))
+        self.SHORT_LINK_CACHE_TTL = int(os.getenv("SHORT_LINK_CACHE_TTL", "86400"))
+        self.CASTBOX_CACHE_MAX_SIZE = int(os.getenv("CASTBOX_CACHE_MAX_SIZE", "200"))
+        self.CASTBOX_CACHE_TTL = int(os.getenv("CASTBOX_CACHE_TTL", "1800"))
+        # لیست‌های صفحه‌بندی شده (core/result_store.py)
+        self.RESULT_STORE_MAX_SIZE = int(os.getenv("RESULT_STORE_MAX_SIZE", "1000"))
+        self.RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", "3600"))
+
+        # --- تعداد دانلودهای همزمان (worker) ---
+        self.DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+        # local: اجرا در همین پردازه | celery: اجرا در worker های جداگانه (tasks.py)
+        self.DOWNLOAD_BACKEND = os.getenv("DOWNLOAD_BACKEND", "local").lower()
+        self.CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+
+        # --- وضعیت درخواست‌های دانلود ---
+        # memory: در همین پردازه | redis: ماندگار و مشترک بین چند نمونه ربات
+        self.REQUEST_STATE_BACKEND = os.getenv("REQUEST_STATE_BACKEND", "memory").lower()
+        self.REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/1")
+        self.REQUEST_STATE_MAX_SIZE = int(os.getenv("REQUEST_STATE_MAX_SIZE", "10000"))
+        # درخواست‌های تایید نشده و آدرس‌های کوتاه شده پس از این مدت حذف می‌شوند
+        self.REQUEST_STATE_TTL = int(os.getenv("REQUEST_STATE_TTL", "3600"))
+        # پرچم لغو باید از طولانی‌ترین دانلود بیشتر عمر کند
+        self.CANCEL_FLAG_TTL = int(os.getenv("CANCEL_FLAG_TTL", "21600"))
+
+        # --- نحوه دریافت آپدیت‌ها ---
+        # polling: همین پردازه | webhook: سرور داخلی و توزیع بین replica ها | replica: فقط پردازش صف یک shard
+        self.BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+        self.WEBHOOK_URL = os.getenv("WEBHOOK_URL") or None
+        self.WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+        self.WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+        self.WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+        # در صورت عدم تنظیم، از توکن ربات ساخته می‌شود تا در همه نمونه‌ها یکسان باشد
+        self.WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(bot_token.encode()).hexdigest()[:32]
+        self.WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+        self.BOT_REPLICAS = int(os.getenv("BOT_REPLICAS", "1"))
+        self.BOT_REPLICA_INDEX = int(os.getenv("BOT_REPLICA_INDEX", "0"))
+        # memory: تک پردازه | redis: مشترک بین replica ها (قفل‌ها و صف آپدیت‌ها)
+        self.SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+        # قفل‌های مشترک (مثلاً دانلود یک فایل) پس از این مدت (ثانیه) خودکار آزاد می‌شوند
+        self.SHARED_LOCK_TTL = int(os.getenv("SHARED_LOCK_TTL", "1800"))
+
+        # --- سرور Bot API خودمیزبان (telegram-bot-api) ---
+        # مثال: http://telegram-bot-api:8081/bot ؛ خالی یعنی api.telegram.org
+        self.TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL") or None
+        self.TELEGRAM_API_BASE_FILE_URL = os.getenv("TELEGRAM_API_BASE_FILE_URL") or None
+        # در حالت local فایل‌ها با مسیر روی دیسک (volume مشترک) آپلود می‌شوند
+        self.TELEGRAM_LOCAL_MODE = bool(self.TELEGRAM_API_BASE_URL) and os.getenv("TELEGRAM_LOCAL_MODE", "true").lower() == "true"
+        # سقف آپلود ربات: 2000 مگابایت با سرور local و 50 مگابایت با API عمومی
+        default_upload_limit = 2000 * 1024 * 1024 if self.TELEGRAM_LOCAL_MODE else 50 * 1024 * 1024
+        self.TELEGRAM_UPLOAD_LIMIT = int(os.getenv("TELEGRAM_UPLOAD_LIMIT", str(default_upload_limit)))
+
+        # --- استخرهای اتصال Bot API: درخواست‌های کوچک (control)، آپلود فایل (media) و getUpdates ---
+        # "2" نیاز به نصب python-telegram-bot[http2] دارد
+        self.TG_HTTP_VERSION = os.getenv("TG_HTTP_VERSION", "1.1")
+        self.TG_CONNECT_TIMEOUT = float(os.getenv("TG_CONNECT_TIMEOUT", "30"))
+        self.TG_POOL_TIMEOUT = float(os.getenv("TG_POOL_TIMEOUT", "10"))
+        self.TG_CONTROL_POOL_SIZE = int(os.getenv("TG_CONTROL_POOL_SIZE", "64"))
+        self.TG_CONTROL_READ_TIMEOUT = float(os.getenv("TG_CONTROL_READ_TIMEOUT", "30"))
+        self.TG_MEDIA_POOL_SIZE = int(os.getenv("TG_MEDIA_POOL_SIZE", "8"))
+        self.TG_MEDIA_READ_TIMEOUT = float(os.getenv("TG_MEDIA_READ_TIMEOUT", "300"))
+        self.TG_MEDIA_WRITE_TIMEOUT = float(os.getenv("TG_MEDIA_WRITE_TIMEOUT", "600"))
+        self.TG_UPDATES_READ_TIMEOUT = float(os.getenv("TG_UPDATES_READ_TIMEOUT", "60"))
+
+        # --- محدودیت نرخ ارسال پیام (پیام در ثانیه) مطابق محدودیت‌های تلگرام ---
+        self.RATE_LIMIT_OVERALL = float(os.getenv("RATE_LIMIT_OVERALL", "30"))
+        self.RATE_LIMIT_PER_CHAT = float(os.getenv("RATE_LIMIT_PER_CHAT", "1"))
+        self.RATE_LIMIT_CHAT_BURST = float(os.getenv("RATE_LIMIT_CHAT_BURST", "3"))
+        self.RATE_LIMIT_PER_GROUP = float(os.getenv("RATE_LIMIT_PER_GROUP", str(20 / 60)))
+        # تعداد دفعات ارسال مجدد پس از خطای RetryAfter
+        self.RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+        # سقف سراسری در هر پردازه جداگانه اعمال می‌شود و بین پردازه‌های ارسال‌کننده تقسیم می‌شود؛
+        # پیش‌فرض: replica های ربات و یک worker سلری. با چند پردازه worker (--concurrency) مجموع را تنظیم کنید
+        default_processes = self.BOT_REPLICAS + (1 if self.DOWNLOAD_BACKEND == "celery" else 0)
+        self.RATE_LIMIT_PROCESSES = max(1, int(os.getenv("RATE_LIMIT_PROCESSES", str(default_processes))))
+
+        # --- حداکثر تعداد آپدیت‌های تلگرام که همزمان پردازش می‌شوند ---
+        self.MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+        # سقف آپدیت‌های در حال اجرا به علاوه آپدیت‌های منتظر نوبت کاربر خود
+        self.MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", str(self.MAX_CONCURRENT_UPDATES * 4)))
+
+        # --- پردازش همزمان لینک‌های یک پیام: سقف هر کاربر و سقف کل هر سرویس ---
+        self.BATCH_CONCURRENCY_PER_USER = int(os.getenv("BATCH_CONCURRENCY_PER_USER", "5"))
+        self.BATCH_CONCURRENCY_PER_SERVICE = int(os.getenv("BATCH_CONCURRENCY_PER_SERVICE", "8"))
+
+        # --- تنظیمات استخر اتصال HTTP مشترک ---
+        self.HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+        self.HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+        self.HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+        self.HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+        # --- تلاش مجدد با پراکسی دیگر هنگام خطای پراکسی ---
+        self.PROXY_MAX_ATTEMPTS = int(os.getenv("PROXY_MAX_ATTEMPTS", "3"))
+        # آخرین تلاش بدون پراکسی (اتصال مستقیم) انجام شود
+        self.PROXY_DIRECT_FALLBACK = os.getenv("PROXY_DIRECT_FALLBACK", "true").lower() == "true"
+        # سقف زمان کل استخراج اطلاعات (ثانیه)
+        self.EXTRACT_DEADLINE = float(os.getenv("EXTRACT_DEADLINE", "45"))
+        # اگر استخراج پس از این مدت (ثانیه) تمام نشود، پراکسی دوم به صورت موازی امتحان می‌شود (0 = غیرفعال)
+        self.EXTRACT_HEDGE_DELAY = float(os.getenv("EXTRACT_HEDGE_DELAY", "0"))
+        # پس از این مدت (ثانیه) تلاش دانلود جدیدی شروع نمی‌شود؛ دانلود در حال اجرا قطع نمی‌شود
+        self.DOWNLOAD_RETRY_DEADLINE = float(os.getenv("DOWNLOAD_RETRY_DEADLINE", "600"))
+
 # یک نمونه (instance) از کلاس تنظیمات ساخته می‌شود تا در کل پروژه از آن استفاده شود.
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,112 @@
+# core/shared_state.py
+"""
+وضعیت مشترک بین چند نمونه (replica) ربات: مقادیر موقت، قفل‌ها و صف آپدیت‌های هر shard.
+پیاده‌سازی حافظه‌ای برای اجرای تک پردازه و Redis برای اجرای چند نمونه‌ای (SHARED_STATE_BACKEND).
+وضعیت درخواست‌های دانلود پیاده‌سازی Redis جداگانه خود را دارد (core/request_state.py).
+"""
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from core.cache import TTLCache
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class MemorySharedState:
+    """وضعیت مشترک درون همین پردازه (برای حالت polling یا webhook بدون replica)."""
+    name = 'memory'
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self._values = TTLCache('shared_state', max_size, ttl)
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._queues: dict[int, asyncio.Queue] = {}
+
+    async def get(self, key: str) -> str | None:
+        return self._values.get(key)
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        self._values.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self._values.pop(key)
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float) -> AsyncIterator[None]:
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[name] = lock
+        async with lock:
+            yield
+
+    def _queue(self, shard: int) -> asyncio.Queue:
+        if shard not in self._queues:
+            self._queues[shard] = asyncio.Queue()
+        return self._queues[shard]
+
+    async def push_update(self, shard: int, payload: str):
+        await self._queue(shard).put(payload)
+
+    async def pop_update(self, shard: int, timeout: float) -> str | None:
+        try:
+            return await asyncio.wait_for(self._queue(shard).get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class RedisSharedState:
+    """
+    وضعیت مشترک در Redis: قفل‌ها با انقضای خودکار (تا با از کار افتادن یک نمونه باقی نمانند)
+    و صف آپدیت‌های هر shard به صورت لیست Redis که آپدیت‌ها را تا بالا آمدن replica نگه می‌دارد.
+    """
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str = 'mdb'):
+        import redis.asyncio as redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str | int) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def get(self, key: str) -> str | None:
+        return await self._redis.get(self._key('state', key))
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        await self._redis.set(self._key('state', key), value, ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str):
+        await self._redis.delete(self._key('state', key))
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float) -> AsyncIterator[None]:
+        from redis.exceptions import LockError
+        lock = self._redis.lock(self._key('lock', name), timeout=ttl)
+        await lock.acquire()
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                # قفل پیش از پایان کار منقضی شده است
+                logger.warning(f"Shared lock '{name}' expired before it was released.")
+
+    async def push_update(self, shard: int, payload: str):
+        await self._redis.lpush(self._key('updates', shard), payload)
+
+    async def pop_update(self, shard: int, timeout: float) -> str | None:
+        item = await self._redis.brpop(self._key('updates', shard), timeout=timeout)
+        return item[1] if item else None
+
+def get_shared_state():
+    """پیاده‌سازی وضعیت مشترک را بر اساس تنظیمات SHARED_STATE_BACKEND برمی‌گرداند."""
+    if settings.SHARED_STATE_BACKEND == 'redis':
+        return RedisSharedState(settings.REDIS_URL)
+    if settings.SHARED_STATE_BACKEND != 'memory':
+        logger.warning(f"Unknown SHARED_STATE_BACKEND '{settings.SHARED_STATE_BACKEND}', falling back to memory.")
+    return MemorySharedState()
+
+shared_state = get_shared_state()
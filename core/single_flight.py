@@ -0,0 +1,67 @@
+# core/single_flight.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+class FlightAbandoned(Exception):
+    """اجرای اصلی یک کلید لغو شد؛ منتظرها باید خودشان دوباره تلاش کنند."""
+
+class SingleFlight:
+    """
+    درخواست‌های همزمان با کلید یکسان را ادغام می‌کند:
+    اولین فراخوان کار را انجام می‌دهد و بقیه منتظر همان نتیجه می‌مانند.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def waiters(self, key: Hashable) -> int:
+        """تعداد فراخوان‌هایی که منتظر نتیجه این کلید هستند."""
+        return self._waiters.get(key, 0)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 private_errors: tuple[type[Exception], ...] = ()) -> tuple[Any, bool]:
+        """
+        fn را فقط یک بار برای هر کلید در حال اجرا فراخوانی می‌کند.
+        خطاهای private_errors مختص فراخوان اصلی هستند (مثلاً لغو توسط همان کاربر یا سقف پلن او)؛
+        منتظرها به جای آن FlightAbandoned دریافت کرده و خودشان دوباره تلاش می‌کنند.
+        خروجی: (نتیجه، آیا این فراخوان خودش کار را انجام داده است)
+        """
+        while key in self._calls:
+            future = self._calls[key]
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            try:
+                return await asyncio.shield(future), False
+            except FlightAbandoned:
+                continue
+            finally:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    self._waiters.pop(key, None)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(FlightAbandoned(key))
+            future.exception()  # جلوگیری از هشدار "exception was never retrieved"
+            raise
+        except Exception as e:
+            future.set_exception(FlightAbandoned(key) if isinstance(e, private_errors) else e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if self.waiters(key):
+                logger.info(f"[{self.name}] Result for {key} shared with {self.waiters(key)} waiting request(s).")
+            return result, True
+        finally:
+            self._calls.pop(key, None)
@@ -0,0 +1,67 @@
+# core/url_resolver.py
+
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+import aiohttp
+
+from core.cache import TTLCache
+from core.http_client import http_client
+from core.settings import settings
+from core.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# کوتاه‌کننده‌هایی که برای رسیدن به لینک اصلی باید ریدایرکت آن‌ها دنبال شود
+SHORTENER_HOSTS = frozenset({
+    'on.soundcloud.com',
+    'vm.tiktok.com',
+    'vt.tiktok.com',
+    't.co',
+    'fb.watch',
+    'spotify.link',
+})
+
+RESOLVE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# نگاشت لینک کوتاه ← لینک اصلی؛ لینک‌های تکراری بدون درخواست شبکه باز می‌شوند
+short_link_cache = TTLCache('short_links', settings.SHORT_LINK_CACHE_MAX_SIZE, settings.SHORT_LINK_CACHE_TTL)
+_resolve_flights = SingleFlight('short_links')
+
+def _host(url: str) -> str:
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+async def _follow_redirects(url: str) -> str:
+    session = http_client.session
+    # بعضی کوتاه‌کننده‌ها به HEAD پاسخ نمی‌دهند؛ در این صورت GET امتحان می‌شود
+    for method in (session.head, session.get):
+        try:
+            async with method(url, allow_redirects=True, timeout=RESOLVE_TIMEOUT) as response:
+                if response.status < 400:
+                    return str(response.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Could not resolve short link {url}: {e}")
+            break
+    return url
+
+async def resolve_short_url(url: str) -> str:
+    """لینک‌های کوتاه شده را به لینک اصلی تبدیل می‌کند؛ سایر لینک‌ها بدون تغییر برمی‌گردند."""
+    host = _host(url)
+    if host == 'youtu.be':
+        # شناسه ویدیو در خود لینک است و نیازی به درخواست شبکه نیست
+        parsed = urlparse(url)
+        video_id = parsed.path.strip('/')
+        return f"https://www.youtube.com/watch?v={video_id}" if video_id else url
+    if host not in SHORTENER_HOSTS:
+        return url
+
+    cached = short_link_cache.get(url)
+    if cached:
+        return cached
+
+    resolved, _ = await _resolve_flights.do(url, lambda: _follow_redirects(url))
+    if resolved != url:
+        short_link_cache.set(url, resolved)
+    return resolved
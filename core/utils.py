@@ -1,6 +1,10 @@
 # core/utils.py
 import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
 from telegram.error import BadRequest
+from core.settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -24,4 +28,68 @@ async def edit_message_safe(query, text, is_photo, reply_markup=None):
     except BadRequest as e:
         # خطای "message is not modified" را نادیده می‌گیرد چون مهم نیست
         if "message is not modified" not in str(e):
-            logger.warning(f"Could not edit message: {e}")
\ No newline at end of file
+            logger.warning(f"Could not edit message: {e}")
+
+@contextmanager
+def upload_file(path: str | Path) -> Iterator[BinaryIO | Path]:
+    """
+    فایل را برای آپلود به تلگرام آماده می‌کند. در حالت local سرور Bot API، مسیر مطلق فایل
+    ارسال می‌شود و سرور خودش آن را از volume مشترک می‌خواند (بدون خواندن فایل در پایتون)؛
+    در غیر این صورت فایل برای ارسال از طریق HTTP باز می‌شود.
+    """
+    if settings.TELEGRAM_LOCAL_MODE:
+        yield Path(path).resolve()
+    else:
+        with open(path, 'rb') as file:
+            yield file
+
+class MessageRef:
+    """
+    ارجاع سبک و قابل سریال‌سازی به یک پیام ربات (شناسه چت و پیام).
+    با آن می‌توان بدون نیاز به query (مثلاً در worker جداگانه) پیام را ویرایش یا حذف کرد.
+    """
+    __slots__ = ('chat_id', 'message_id', 'is_photo')
+
+    def __init__(self, chat_id: int, message_id: int, is_photo: bool = False):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.is_photo = is_photo
+
+    @classmethod
+    def from_query(cls, query) -> "MessageRef":
+        return cls(query.message.chat_id, query.message.message_id, bool(query.message.photo))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MessageRef":
+        return cls(data['chat_id'], data['message_id'], data.get('is_photo', False))
+
+    def to_dict(self) -> dict:
+        return {'chat_id': self.chat_id, 'message_id': self.message_id, 'is_photo': self.is_photo}
+
+    async def edit(self, bot, text, reply_markup=None, rate_limit_args=None):
+        """
+        همانند edit_message_safe، متن یا کپشن پیام را با نادیده گرفتن خطاهای بی‌اهمیت ویرایش می‌کند.
+        rate_limit_args اولویت ویرایش را در محدودکننده نرخ تعیین می‌کند (core/rate_limiter.py).
+        """
+        try:
+            if self.is_photo:
+                await bot.edit_message_caption(
+                    chat_id=self.chat_id, message_id=self.message_id,
+                    caption=text, reply_markup=reply_markup, parse_mode='Markdown',
+                    rate_limit_args=rate_limit_args,
+                )
+            else:
+                await bot.edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message_id,
+                    text=text, reply_markup=reply_markup, parse_mode='Markdown',
+                    rate_limit_args=rate_limit_args,
+                )
+        except BadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning(f"Could not edit message: {e}")
+
+    async def delete(self, bot):
+        try:
+            await bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+        except BadRequest as e:
+            logger.warning(f"Could not delete message: {e}")
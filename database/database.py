@@ -1,18 +1,33 @@
 # database/database.py
 
+import os
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from database.models import Base
 
 # استفاده از درایور aiosqlite برای حالت غیرهمزمان
-DATABASE_URL = "sqlite+aiosqlite:///bot_database.db"
+# replica ها باید به یک دیتابیس مشترک وصل شوند (مثلاً فایل روی volume مشترک)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///bot_database.db")
+# مدت انتظار یک اتصال SQLite برای آزاد شدن قفل نوشتن توسط پردازه دیگر (میلی‌ثانیه)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
 
 # ساخت موتور غیرهمزمان
 async_engine = create_async_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}, # برای SQLite همچنان لازم است
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}, # برای SQLite همچنان لازم است
     echo=False, # برای دیباگ کردن کوئری‌ها می‌توانید True کنید
 )
 
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        # WAL خواندن همزمان را در کنار نوشتن ممکن می‌کند و busy_timeout به جای خطای
+        # "database is locked" منتظر نوشتن replica های دیگر می‌ماند
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
 # ساخت یک SessionMaker غیرهمزمان که در کل پروژه استفاده خواهد شد
 AsyncSessionLocal = async_sessionmaker(
     bind=async_engine,
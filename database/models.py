@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy import (Column, Integer, String, BigInteger, DateTime,
-                        ForeignKey, Text, Date, func, Boolean)
+                        ForeignKey, Text, Date, func, Boolean, Float)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -46,6 +46,7 @@ class PromoCode(Base):
 class FileCache(Base):
     __tablename__ = 'file_cache'
     id = Column(Integer, primary_key=True)
+    # کلید نرمال‌شده کش به شکل service:resource_id:quality (core/file_cache.py)
     original_url = Column(String, unique=True, nullable=False, index=True)
     file_id = Column(String, nullable=False)
     file_type = Column(String)
@@ -71,4 +72,22 @@ class ServiceStatus(Base):
     __tablename__ = 'service_status'
     id = Column(Integer, primary_key=True)
     service_name = Column(String, unique=True, nullable=False)
-    is_enabled = Column(Boolean, default=True)
\ No newline at end of file
+    is_enabled = Column(Boolean, default=True)
+class KeyValue(Base):
+    """مقادیر کوچک و ماندگار (مانند توکن‌های استخراج شده سرویس‌ها) به همراه زمان به‌روزرسانی."""
+    __tablename__ = 'kv_store'
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class ProxyHealth(Base):
+    """آخرین وضعیت شناخته شده پراکسی‌های معتبر تا پس از راه‌اندازی مجدد دوباره استفاده شوند."""
+    __tablename__ = 'proxy_health'
+    proxy = Column(String, primary_key=True)
+    latency = Column(Float, nullable=False)
+    health = Column(Float, nullable=False)
+    successes = Column(Integer, default=0)
+    failures = Column(Integer, default=0)
+    checked_at = Column(DateTime, nullable=False)
+    # سلامت پراکسی برای هر سرویس مقصد به صورت JSON
+    targets = Column(Text, default='{}')
@@ -7,9 +7,13 @@ import uvloop
 
 from bot.application import create_application
 from bot.handlers import register_handlers
+from bot.webhook import start_webhook_server, consume_updates
 from database import database
 from core.handlers.service_manager import initialize_services
 from core.scheduler import setup_scheduler
+from core.http_client import http_client
+from core.settings import settings
+from services import SERVICES
 import config
 
 uvloop.install()
@@ -49,23 +53,58 @@ async def main() -> None:
     logger.info("Initializing services in database...")
     await initialize_services()
 
-    # اجرای اولیه اسکن پراکسی در هنگام راه‌اندازی ربات
-    asyncio.create_task(config.update_and_test_proxies())
+    # آماده‌سازی سرویس‌ها در پس‌زمینه تا اولین درخواست کاربر هزینه آن را نپردازد
+    for service in SERVICES:
+        asyncio.create_task(service.warm_up())
+
+    # وظایف سراسری (گزارش روزانه، اسکن و ذخیره پراکسی‌ها) فقط در نمونه اصلی (polling/webhook) اجرا می‌شوند
+    primary = settings.BOT_MODE != 'replica'
+    config.MAINTAIN_PROXIES = primary
+
+    # پراکسی‌های سالم اجرای قبلی فوراً در دسترس قرار می‌گیرند؛ منابع در پس‌زمینه بررسی می‌شوند
+    await config.load_proxy_health()
+    if primary:
+        asyncio.create_task(config.update_and_test_proxies())
 
     application = create_application()
     register_handlers(application)
     
-    logger.info("Starting bot polling with uvloop...")
     async with application:
         await application.start()
-        await application.updater.start_polling()
+        runner = consumer = None
+        if settings.BOT_MODE == 'webhook':
+            logger.info("Starting webhook server with uvloop...")
+            runner = await start_webhook_server(application)
+        elif settings.BOT_MODE == 'replica':
+            # آپدیت‌ها توسط نمونه webhook بر اساس شناسه کاربر به صف این replica فرستاده می‌شوند
+            logger.info(f"Starting bot replica {settings.BOT_REPLICA_INDEX} with uvloop...")
+            consumer = asyncio.create_task(consume_updates(application, settings.BOT_REPLICA_INDEX))
+        else:
+            logger.info("Starting bot polling with uvloop...")
+            await application.updater.start_polling()
         
-        scheduler = setup_scheduler(application)
+        scheduler = setup_scheduler(application, primary=primary)
         
-        scheduler.add_job(config.update_and_test_proxies, 'cron', hour=3, minute=0)
-        logger.info("Proxy update and validation job scheduled to run daily at 03:00.")
+        if primary:
+            # به جای اسکن کامل روزانه: تست ورودی‌های جدید منابع و بازبینی تدریجی پراکسی‌های موجود
+            scheduler.add_job(config.update_and_test_proxies, 'interval', hours=1)
+            scheduler.add_job(config.revalidate_proxies, 'interval', minutes=1)
+            scheduler.add_job(config.persist_proxy_health, 'interval', minutes=10)
+            logger.info("Incremental proxy maintenance jobs scheduled.")
+        else:
+            # replica ها پراکسی‌های تایید شده توسط نمونه اصلی را از دیتابیس برمی‌دارند
+            scheduler.add_job(config.load_proxy_health, 'interval', minutes=10)
         
-        await asyncio.Event().wait()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            if consumer:
+                consumer.cancel()
+            if runner:
+                await runner.cleanup()
+            if primary:
+                await config.persist_proxy_health()
+            await http_client.close()
 
 
 if __name__ == "__main__":
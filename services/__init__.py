@@ -35,4 +35,8 @@ SERVICES = [
     RedditService(),
     TwitchService(),
     RedTubeService()
-]
\ No newline at end of file
+]
+
+# ایندکس مسیریابی لینک‌ها یک بار در زمان import ساخته می‌شود
+from .router import install as _install_router
+url_router = _install_router(SERVICES)
@@ -5,13 +5,14 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from services.base_service import BaseService
 from core.handlers.user_manager import can_download
-from core.handlers.download.callbacks import url_cache  # وارد کردن حافظه موقت
+from core.request_state import request_state
 
 BANDCAMP_URL_PATTERN = re.compile(r"(?:https?://)?([a-zA-Z0-9-]+\.bandcamp\.com)/?(?:(track|album)/([a-zA-Z0-9-]+))?")
 
 class BandcampService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(BANDCAMP_URL_PATTERN, url) is not None
+    HOSTS = ('bandcamp.com',)
+    URL_PATTERNS = (BANDCAMP_URL_PATTERN,)
+    PROBE_URL = 'https://bandcamp.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
@@ -43,7 +44,7 @@ class BandcampService(BaseService):
                 if full_url:
                     # FIX: استفاده از کلید کوتاه و ذخیره URL کامل در حافظه موقت
                     short_key = uuid.uuid4().hex[:12]
-                    url_cache[short_key] = full_url
+                    await request_state.put_url(short_key, full_url)
                     keyboard.append([InlineKeyboardButton(f"🎧 {entry.get('title', 'Unknown Track')}", callback_data=f"dl:prepare:bandcamp:audio:{short_key}")])
             
             await msg.delete()
@@ -65,7 +66,7 @@ class BandcampService(BaseService):
 
             # FIX: استفاده از کلید کوتاه برای تک‌آهنگ
             short_key = uuid.uuid4().hex[:12]
-            url_cache[short_key] = full_url
+            await request_state.put_url(short_key, full_url)
             
             title = info.get('track', info.get('title', 'Bandcamp Release'))
             uploader = info.get('artist', 'N/A')
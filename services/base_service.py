@@ -1,23 +1,69 @@
 # services/base_service.py
 
+import re
+import asyncio
 import logging
 from typing import Any, Dict
 import yt_dlp
 from telegram import Update
 from telegram.ext import ContextTypes
-import config
 from yt_dlp.utils import DownloadError
+from core.cache import TTLCache
+from core.http_client import HttpClient, http_client
+from core.proxy_retry import is_content_unavailable_error, is_geo_restricted_error, run_with_failover
+from core.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# لینک‌هایی که اخیراً خصوصی/حذف‌شده/در دسترس نبودن آن‌ها تایید شده است
+unavailable_cache = TTLCache('unavailable_urls', settings.NEGATIVE_CACHE_MAX_SIZE, settings.NEGATIVE_CACHE_TTL)
+
 class BaseService:
     """
     کلاس پایه انتزاعی برای تمام سرویس‌های دانلود.
     هر سرویس جدید باید از این کلاس ارث‌بری کرده و متدهای آن را پیاده‌سازی کند.
     """
+    # دامنه‌های پشتیبانی شده (بدون www) و الگوهای لینک؛ services/router.py از آن‌ها ایندکس می‌سازد
+    HOSTS: tuple[str, ...] = ()
+    URL_PATTERNS: tuple[re.Pattern, ...] = ()
+    # برای الگوهایی که باید در هر جای لینک جستجو شوند (به جای تطبیق از ابتدای آن)
+    URL_SEARCH: bool = False
+    # آدرس سبکی روی هاست واقعی سرویس که پراکسی‌ها با آن تست می‌شوند (config.revalidate_proxies)
+    PROBE_URL: str | None = None
+
+    @property
+    def name(self) -> str:
+        """نام سرویس همان‌طور که در جدول service_status ثبت شده است."""
+        return self.__class__.__name__.replace("Service", "").lower()
+
+    @property
+    def http(self) -> HttpClient:
+        """کلاینت HTTP مشترک (استخر اتصال) برای درخواست‌های شبکه سرویس."""
+        return http_client
+
+    def is_available(self) -> bool:
+        """سرویس‌هایی که به کلاینت خارجی وابسته‌اند می‌توانند در صورت خطا خود را غیرفعال کنند."""
+        return True
+
+    def match_url(self, url: str) -> re.Match | None:
+        """لینک را با الگوهای سرویس تطبیق می‌دهد."""
+        for pattern in self.URL_PATTERNS:
+            match = pattern.search(url) if self.URL_SEARCH else pattern.match(url)
+            if match:
+                return match
+        return None
+
+    def route_info(self, match: re.Match) -> tuple[str | None, str | None]:
+        """نوع لینک و شناسه منبع را از نتیجه تطبیق استخراج می‌کند: (link_type, resource_id)"""
+        return None, (match.group(match.lastindex) if match.lastindex else None)
+
+    async def warm_up(self):
+        """آماده‌سازی پس‌زمینه سرویس (مثلاً دریافت توکن‌ها) در زمان راه‌اندازی ربات."""
+        return None
+
     async def can_handle(self, url: str) -> bool:
         """بررسی می‌کند که آیا این سرویس می‌تواند URL داده شده را پردازش کند."""
-        raise NotImplementedError("This method must be implemented by a subclass.")
+        return self.is_available() and self.match_url(url) is not None
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, url: str):
         """درخواست کاربر را پردازش کرده و گزینه‌های دانلود را ارائه می‌دهد."""
@@ -26,31 +72,43 @@ class BaseService:
     async def _extract_info_ydl(self, url: str, ydl_opts: Dict[str, Any] = None) -> Dict[str, Any] | None:
         """
         یک متد کمکی برای استخراج اطلاعات با استفاده از yt-dlp.
-        این متد پراکسی را به صورت خودکار انجام می‌دهد.
+        این متد پراکسی را به صورت خودکار انجام می‌دهد و در صورت خطای پراکسی، با پراکسی دیگر
+        یا اتصال مستقیم دوباره تلاش می‌کند (core/proxy_retry.py).
+        لینک‌هایی که اخیراً در دسترس نبوده‌اند بدون درخواست شبکه رد می‌شوند.
         """
-        proxy = config.get_random_proxy()
-        try:
-            default_opts = {
-                'quiet': True,
-                'noplaylist': True,
-                'nocheckcertificate': True,
-                'proxy': proxy,
-            }
+        if unavailable_cache.get(url):
+            logger.info(f"Skipping recently unavailable URL {url}")
+            return None
 
-            if ydl_opts:
-                default_opts.update(ydl_opts)
+        default_opts = {
+            'quiet': True,
+            'noplaylist': True,
+            'nocheckcertificate': True,
+        }
+        if ydl_opts:
+            default_opts.update(ydl_opts)
 
-            with yt_dlp.YoutubeDL(default_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-            return info
+        def extract(proxy: str | None):
+            with yt_dlp.YoutubeDL({**default_opts, 'proxy': proxy}) as ydl:
+                return ydl.extract_info(url, download=False)
 
+        try:
+            # اجرا در thread جداگانه تا پردازش همزمان لینک‌ها حلقه رویداد را مسدود نکند
+            return await run_with_failover(
+                extract, target=self.name, deadline=settings.EXTRACT_DEADLINE,
+                hedge_delay=settings.EXTRACT_HEDGE_DELAY,
+            )
         except DownloadError as e:
-            if proxy and 'proxy' in str(e).lower():
-                config.handle_proxy_failure(proxy)
+            if is_content_unavailable_error(e):
+                unavailable_cache.set(url, True)
+            elif is_geo_restricted_error(e):
+                # همه مسیرهای امتحان شده مسدود بودند؛ پراکسی‌های بعدی ممکن است موفق شوند
+                unavailable_cache.set(url, True, ttl=settings.NEGATIVE_CACHE_GEO_TTL)
             logger.warning(f"yt-dlp DownloadError for URL {url}: {e}")
             return None
+        except asyncio.TimeoutError:
+            logger.warning(f"Metadata extraction for URL {url} exceeded {settings.EXTRACT_DEADLINE}s.")
+            return None
         except Exception as e:
-            if proxy:
-                config.handle_proxy_failure(proxy)
             logger.error(f"Generic error in _extract_info_ydl for URL {url}: {e}", exc_info=True)
             return None
\ No newline at end of file
@@ -1,19 +1,26 @@
 # services/castbox.py
 import re
 import json
+import asyncio
 import logging
 import time
 import os
 from urllib.parse import unquote
-import requests
+import aiohttp
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from bs4 import BeautifulSoup
 from html import unescape
+from typing import Sequence
 
 from services.base_service import BaseService
-from core.handlers.user_manager import can_download
+from services.router import route_url
+from core.cache import TTLCache
+from core.result_store import result_store, ResultItem
+from core.settings import settings
+from core.handlers.user_manager import can_download, get_file_size_limit
 from core.log_forwarder import forward_download_to_log_channel
+from core.utils import upload_file
 
 logger = logging.getLogger(__name__)
 
@@ -22,36 +29,79 @@ CASTBOX_EPISODE_URL_PATTERN = re.compile(r"https?://castbox\.fm/episode/.+-id(?P
 CASTBOX_SHORT_URL_PATTERN = re.compile(r"https?://castbox\.fm/ep/(?P<id>\d+)")
 CASTBOX_CHANNEL_URL_PATTERN = re.compile(r"https?://castbox\.fm/channel/(?:.*-)?id(?P<id>\d+)")
 
-# تعریف حد حجم تلگرام برای آپلود توسط ربات
-TELEGRAM_BOT_UPLOAD_LIMIT = 49 * 1024 * 1024
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/5.0 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+PAGE_TIMEOUT = aiohttp.ClientTimeout(total=15)
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# داده‌های استخراج شده صفحات (کلید channel:<id> یا episode:<id>) و نگاشت قسمت ← کانال
+castbox_page_cache = TTLCache('castbox_pages', settings.CASTBOX_CACHE_MAX_SIZE, settings.CASTBOX_CACHE_TTL)
+castbox_episode_index = TTLCache('castbox_episodes', settings.CASTBOX_CACHE_MAX_SIZE * 100, settings.CASTBOX_CACHE_TTL)
+
+def _parse_page_data(html: str) -> dict | None:
+    soup = BeautifulSoup(html, 'html.parser')
+    script_content = soup.find('script', string=re.compile(r"window\.__INITIAL_STATE__"))
+    if not script_content: return None
+    match = re.search(r"window\.__INITIAL_STATE__\s*=\s*\"(.*)\";", script_content.string)
+    if not match: return None
+    return json.loads(unquote(match.group(1)))
+
+def _find_episode(page_data: dict, episode_id: str) -> dict | None:
+    return next((ep for ep in page_data.get('ch', {}).get('eps', []) if str(ep.get('eid')) == episode_id), None)
 
 class CastboxService(BaseService):
+    HOSTS = ('castbox.fm',)
+    URL_PATTERNS = (CASTBOX_EPISODE_URL_PATTERN, CASTBOX_SHORT_URL_PATTERN, CASTBOX_CHANNEL_URL_PATTERN)
     
     def _sanitize_filename(self, text: str) -> str:
         """کاراکترهای غیرمجاز را از نام فایل حذف کرده و طول آن را محدود می‌کند."""
         sanitized = re.sub(r'[\\/*?:"<>|]', "", text)
         return sanitized[:100]
 
-    def _extract_page_data(self, page_url: str) -> dict | None:
+    async def _extract_page_data(self, page_url: str) -> dict | None:
         """اطلاعات JSON را از سورس صفحه وب کست‌باکس استخراج می‌کند."""
         try:
             logger.info(f"Fetching page data for URL: {page_url}")
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/5.0 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            response = requests.get(page_url, timeout=15, headers=headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            script_content = soup.find('script', string=re.compile(r"window\.__INITIAL_STATE__"))
-            if not script_content: return None
-            match = re.search(r"window\.__INITIAL_STATE__\s*=\s*\"(.*)\";", script_content.string)
-            if not match: return None
-            return json.loads(unquote(match.group(1)))
+            html = await self.http.get_text(page_url, headers=HEADERS, timeout=PAGE_TIMEOUT)
+            # پردازش HTML سنگین است و در thread جداگانه انجام می‌شود
+            return await asyncio.get_running_loop().run_in_executor(None, _parse_page_data, html)
         except Exception as e:
             logger.error(f"Error in _extract_page_data: {e}", exc_info=True)
             return None
 
-    async def can_handle(self, url: str) -> bool:
-        """بررسی می‌کند که آیا لینک مربوط به کست‌باکس است یا خیر."""
-        return any(re.match(pattern, url) for pattern in [CASTBOX_EPISODE_URL_PATTERN, CASTBOX_SHORT_URL_PATTERN, CASTBOX_CHANNEL_URL_PATTERN])
+    async def _get_channel_data(self, channel_id: str, url: str) -> dict | None:
+        """اطلاعات کانال را از کش یا در صورت نبود، از صفحه کانال برمی‌گرداند."""
+        page_data = castbox_page_cache.get(f"channel:{channel_id}")
+        if page_data is None:
+            page_data = await self._extract_page_data(url)
+            if page_data:
+                castbox_page_cache.set(f"channel:{channel_id}", page_data)
+                # قسمت‌های کانال ایندکس می‌شوند تا دانلود آن‌ها بدون دریافت مجدد صفحه انجام شود
+                for ep in page_data.get('ch', {}).get('eps', []):
+                    if ep.get('eid'):
+                        castbox_episode_index.set(str(ep['eid']), channel_id)
+        return page_data
+
+    async def _get_episode_data(self, episode_id: str, url: str) -> dict | None:
+        """
+        اطلاعات یک قسمت را برمی‌گرداند؛ اگر کانال آن قبلاً دریافت شده باشد از کش کانال،
+        وگرنه از کش صفحه قسمت یا خود صفحه.
+        """
+        channel_id = castbox_episode_index.get(episode_id)
+        if channel_id:
+            channel_data = castbox_page_cache.get(f"channel:{channel_id}")
+            if channel_data and _find_episode(channel_data, episode_id):
+                return channel_data
+
+        page_data = castbox_page_cache.get(f"episode:{episode_id}")
+        if page_data is None:
+            page_data = await self._extract_page_data(url)
+            if page_data:
+                castbox_page_cache.set(f"episode:{episode_id}", page_data)
+        return page_data
+
+    def route_info(self, match: re.Match) -> tuple[str, str]:
+        link_type = 'channel' if match.re is CASTBOX_CHANNEL_URL_PATTERN else 'episode'
+        return link_type, match.group('id')
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str, message_to_edit=None):
         """لینک‌های کست‌باکس را پردازش می‌کند."""
@@ -60,16 +110,24 @@ class CastboxService(BaseService):
             return
 
         msg = message_to_edit or await update.message.reply_text("در حال استخراج اطلاعات... 🧐")
-        
-        page_data = self._extract_page_data(url)
+
+        route = route_url(url)
+        is_channel = route is not None and route.link_type == 'channel'
+        resource_id = route.resource_id if route else None
+        if is_channel:
+            page_data = await self._get_channel_data(resource_id, url)
+        elif resource_id:
+            page_data = await self._get_episode_data(resource_id, url)
+        else:
+            page_data = await self._extract_page_data(url)
         if not page_data:
             await msg.edit_text("❌ اطلاعات از صفحه کست‌باکس دریافت نشد.")
             return
 
-        if bool(re.match(CASTBOX_CHANNEL_URL_PATTERN, url)):
+        if is_channel:
             await self.handle_channel_link(msg, page_data, context)
         else:
-            await self.handle_episode_download(msg, page_data, user, context, url)
+            await self.handle_episode_download(msg, page_data, user, context, url, resource_id)
 
     async def handle_channel_link(self, msg, page_data, context):
         """لیست قسمت‌های یک کانال را نمایش می‌دهد."""
@@ -79,29 +137,29 @@ class CastboxService(BaseService):
             await msg.edit_text("❌ هیچ قسمتی در این کانال یافت نشد.")
             return
 
-        context.bot_data[f"castbox_eps_{msg.chat_id}"] = episodes
+        episodes = result_store.put(result_store.make_key('castbox_eps', msg.chat.id, msg.message_id), episodes, id_field='eid')
         text = f"🎧 **{channel_title}**\n\nلطفاً قسمت مورد نظر برای دانلود را انتخاب کنید (صفحه ۱):"
         keyboard = self.build_episode_keyboard(episodes, chat_id=msg.chat.id, page=1)
         await msg.edit_text(text, reply_markup=keyboard, parse_mode='Markdown')
 
-    def build_episode_keyboard(self, episodes: list, chat_id: int, page: int = 1, per_page: int = 10) -> InlineKeyboardMarkup:
+    def build_episode_keyboard(self, episodes: Sequence[ResultItem], chat_id: int, page: int = 1, per_page: int = 10) -> InlineKeyboardMarkup:
         """دکمه‌های صفحه‌بندی شده برای لیست قسمت‌ها را ایجاد می‌کند."""
         start, end = (page - 1) * per_page, page * per_page
-        buttons = [[InlineKeyboardButton(ep['title'], callback_data=f"castbox:dl:{ep['eid']}")] for ep in episodes[start:end]]
+        buttons = [[InlineKeyboardButton(title, callback_data=f"castbox:dl:{eid}")] for eid, title in episodes[start:end]]
         nav_buttons = []
         if page > 1: nav_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"castbox:page:{page - 1}:{chat_id}"))
         if end < len(episodes): nav_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"castbox:page:{page + 1}:{chat_id}"))
         if nav_buttons: buttons.append(nav_buttons)
         return InlineKeyboardMarkup(buttons)
 
-    async def handle_episode_download(self, msg, page_data, user, context, url):
+    async def handle_episode_download(self, msg, page_data, user, context, url, episode_id: str | None = None):
         """یک قسمت مشخص را دانلود و مدیریت می‌کند."""
         episode_info = page_data.get('trackPlayItem', {}).get('playItem', {})
-        if not episode_info:
-            match = re.search(r'-id(?P<id>\d+)|/ep/(?P<id>\d+)', url)
-            if match:
-                target_eid = next(filter(None, match.groups()))
-                episode_info = next((ep for ep in page_data.get('ch', {}).get('eps', []) if str(ep.get('eid')) == target_eid), None)
+        if episode_id and str(episode_info.get('eid', episode_id)) != episode_id:
+            # صفحه کش شده متعلق به قسمت دیگری از همین کانال است
+            episode_info = None
+        if not episode_info and episode_id:
+            episode_info = _find_episode(page_data, episode_id)
 
         if not episode_info or not episode_info.get('url'):
             await msg.edit_text("❌ اطلاعات این قسمت برای دانلود یافت نشد.")
@@ -111,9 +169,7 @@ class CastboxService(BaseService):
         temp_filename = "" 
         
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/5.0 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            head_response = requests.head(audio_url, headers=headers, allow_redirects=True, timeout=15)
-            file_size = int(head_response.headers.get('content-length', 0))
+            file_size = await self.http.content_length(audio_url, headers=HEADERS, timeout=PAGE_TIMEOUT)
 
             title_raw = episode_info.get('title', 'پادکست')
             artist_raw = page_data.get('ch', {}).get('chInfo', {}).get('title', 'پادکست')
@@ -135,7 +191,8 @@ class CastboxService(BaseService):
                 f"🔗 [لینک کانال]({channel_url}) | [لینک اپیزود]({episode_url})"
             )
 
-            if file_size > TELEGRAM_BOT_UPLOAD_LIMIT:
+            # سقف پلن کاربر (و سقف آپلود Bot API، که با سرور local تا 2 گیگابایت است)
+            if file_size > get_file_size_limit(user):
                 await msg.edit_text(
                     text=caption,
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(f"📥 دانلود مستقیم (فایل حجیم)", url=audio_url)]]),
@@ -148,14 +205,14 @@ class CastboxService(BaseService):
                 temp_filename = f"downloads/{clean_filename}"
                 os.makedirs('downloads', exist_ok=True)
                 
-                with requests.get(audio_url, stream=True, timeout=300, headers=headers) as r:
+                async with self.http.request('GET', audio_url, headers=HEADERS) as r:
                     r.raise_for_status()
                     with open(temp_filename, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=1024*1024):
+                        async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
                             f.write(chunk)
                 
                 await msg.edit_text("دانلود کامل شد. در حال آپلود...", parse_mode='Markdown')
-                with open(temp_filename, 'rb') as audio_file:
+                with upload_file(temp_filename) as audio_file:
                     # --- FIX: پارامتر ناسازگار از اینجا حذف شد ---
                     await context.bot.send_audio(
                         chat_id=msg.chat.id, audio=audio_file, caption=caption, title=title_raw,
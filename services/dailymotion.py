@@ -8,8 +8,9 @@ from core.handlers.user_manager import can_download
 DAILYMOTION_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?dailymotion\.com/video/([a-zA-Z0-9]+)")
 
 class DailymotionService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(DAILYMOTION_URL_PATTERN, url) is not None
+    HOSTS = ('dailymotion.com',)
+    URL_PATTERNS = (DAILYMOTION_URL_PATTERN,)
+    PROBE_URL = 'https://www.dailymotion.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
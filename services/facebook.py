@@ -12,9 +12,10 @@ FACEBOOK_URL_PATTERN = re.compile(
 )
 
 class FacebookService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        """بررسی می‌کند که آیا لینک مربوط به فیسبوک است یا خیر."""
-        return re.search(FACEBOOK_URL_PATTERN, url) is not None
+    HOSTS = ('facebook.com',)
+    URL_PATTERNS = (FACEBOOK_URL_PATTERN,)
+    PROBE_URL = 'https://www.facebook.com/robots.txt'
+    URL_SEARCH = True
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         """لینک‌های ویدیویی فیسبوک را پردازش می‌کند."""
@@ -10,8 +10,10 @@ from instagrapi import Client
 from instagrapi.exceptions import MediaNotFound, UserNotFound
 
 from services.base_service import BaseService
+from services.router import route_url
 from core.handlers.user_manager import can_download
 from core.settings import settings
+from core.utils import upload_file
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,9 @@ INSTAGRAM_URL_PATTERN = re.compile(
 )
 
 class InstagramService(BaseService):
+    HOSTS = ('instagram.com',)
+    URL_PATTERNS = (INSTAGRAM_URL_PATTERN,)
+    URL_SEARCH = True
     _client = None
 
     def __init__(self):
@@ -50,25 +55,26 @@ class InstagramService(BaseService):
             InstagramService._client = None
             print(f"CRITICAL: Instagrapi client failed. Service will be disabled. Error: {e}")
 
-    async def can_handle(self, url: str) -> bool:
-        return InstagramService._client is not None and re.search(INSTAGRAM_URL_PATTERN, url) is not None
+    def is_available(self) -> bool:
+        return InstagramService._client is not None
+
+    def route_info(self, match: re.Match) -> tuple[str, str]:
+        link_part = match.group(1).split('?')[0]
+        is_profile = not link_part.startswith(('p/', 'reel/', 'tv/'))
+        return ('profile', link_part.strip('/')) if is_profile else ('post', link_part)
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
             await update.message.reply_text("شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕")
             return
 
-        match = re.search(INSTAGRAM_URL_PATTERN, url)
-        if not match:
+        route = route_url(url)
+        if not route:
             await update.message.reply_text("❌ لینک اینستاگرام نامعتبر است.")
             return
         
-        link_part = match.group(1).split('?')[0]
-        is_profile = not link_part.startswith(('p/', 'reel/', 'tv/'))
-        
-        if is_profile:
-            username = link_part.strip('/')
-            await self.handle_profile_link(update, context, username)
+        if route.link_type == 'profile':
+            await self.handle_profile_link(update, context, route.resource_id)
         else:
             await self.handle_post_link(update, context, url)
 
@@ -98,7 +104,7 @@ class InstagramService(BaseService):
             if len(caption) > 1024: caption = caption[:1000] + "...`"
             
             await msg.edit_text("✅ دانلود کامل شد. در حال آپلود...")
-            with open(download_path, 'rb') as file_to_send:
+            with upload_file(download_path) as file_to_send:
                 if download_path.suffix == ".mp4":
                     await context.bot.send_video(chat_id=update.effective_chat.id, video=file_to_send, caption=caption, parse_mode='Markdown', supports_streaming=True)
                 else:
@@ -12,9 +12,9 @@ PORNHUB_URL_PATTERN = re.compile(
 )
 
 class PornhubService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        """بررسی می‌کند که آیا لینک مربوط به پورن‌هاب است یا خیر."""
-        return re.match(PORNHUB_URL_PATTERN, url) is not None
+    HOSTS = ('pornhub.com',)
+    URL_PATTERNS = (PORNHUB_URL_PATTERN,)
+    PROBE_URL = 'https://www.pornhub.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         """لینک‌های پورن‌هاب را پردازش می‌کند."""
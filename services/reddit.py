@@ -7,8 +7,9 @@ from services.base_service import BaseService
 REDDIT_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?reddit\.com/r/([a-zA-Z0-9_]+)/comments/([a-zA-Z0-9]+)")
 
 class RedditService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(REDDIT_URL_PATTERN, url) is not None
+    HOSTS = ('reddit.com',)
+    URL_PATTERNS = (REDDIT_URL_PATTERN,)
+    PROBE_URL = 'https://www.reddit.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, url: str):
         msg = await update.message.reply_text("در حال پردازش لینک ردیت...")
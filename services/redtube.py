@@ -9,8 +9,9 @@ from core.handlers.user_manager import can_download
 REDTUBE_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?redtube\.com/(\d+)")
 
 class RedTubeService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(REDTUBE_URL_PATTERN, url) is not None
+    HOSTS = ('redtube.com',)
+    URL_PATTERNS = (REDTUBE_URL_PATTERN,)
+    PROBE_URL = 'https://www.redtube.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         # --- FIX: ADDED DOWNLOAD LIMIT CHECK ---
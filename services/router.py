@@ -0,0 +1,77 @@
+# services/router.py
+
+import re
+import logging
+from functools import lru_cache
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+class RouteMatch:
+    """نتیجه مسیریابی یک لینک: سرویس مناسب به همراه نوع لینک و شناسه منبع."""
+    __slots__ = ('service', 'link_type', 'resource_id', 'match')
+
+    def __init__(self, service, link_type: str | None, resource_id: str | None, match: re.Match):
+        self.service = service
+        self.link_type = link_type
+        self.resource_id = resource_id
+        self.match = match
+
+def _strip_named_groups(pattern: str) -> str:
+    # نام گروه‌ها در الگوی ترکیبی تکراری می‌شوند؛ به گروه بی‌نام تبدیل می‌شوند
+    return re.sub(r"\(\?P<[^>]+>", "(", pattern)
+
+class UrlRouter:
+    """
+    ایندکس مسیریابی لینک‌ها که یک بار از HOSTS و URL_PATTERNS سرویس‌ها ساخته می‌شود.
+    انتخاب سرویس با یک جستجوی دیکشنری روی نام دامنه انجام می‌شود و برای دامنه‌های
+    ناشناخته، یک regex ترکیبی لینک‌های پشتیبانی نشده را بدون بررسی تک‌تک سرویس‌ها رد می‌کند.
+    """
+    def __init__(self, services: list):
+        self.services = list(services)
+        self._by_host: dict[str, list] = {}
+        for service in self.services:
+            for host in service.HOSTS:
+                self._by_host.setdefault(host.lower(), []).append(service)
+        combined = "|".join(
+            f"(?:{_strip_named_groups(p.pattern)})" for s in self.services for p in s.URL_PATTERNS
+        )
+        self._combined = re.compile(combined) if combined else None
+
+    def _candidates(self, url: str) -> list:
+        host = (urlparse(url).hostname or '').lower()
+        labels = host.split('.')
+        # از دامنه کامل به سمت دامنه‌های والد (مثلاً artist.bandcamp.com ← bandcamp.com)
+        for i in range(len(labels) - 1):
+            services = self._by_host.get('.'.join(labels[i:]))
+            if services:
+                return services
+        if self._combined is None or not self._combined.search(url):
+            return []
+        return self.services
+
+    def resolve(self, url: str) -> RouteMatch | None:
+        """سرویس مناسب یک لینک را به همراه (link_type, resource_id) پیدا می‌کند."""
+        for service in self._candidates(url):
+            match = service.match_url(url)
+            if match:
+                link_type, resource_id = service.route_info(match)
+                return RouteMatch(service, link_type, resource_id, match)
+        return None
+
+_router: UrlRouter | None = None
+
+def install(services: list) -> UrlRouter:
+    """مسیریاب پیش‌فرض را از لیست سرویس‌ها می‌سازد (در services/__init__.py فراخوانی می‌شود)."""
+    global _router
+    _router = UrlRouter(services)
+    route_url.cache_clear()
+    return _router
+
+@lru_cache(maxsize=2048)
+def route_url(url: str) -> RouteMatch | None:
+    """
+    لینک را مسیریابی می‌کند. نتیجه کش می‌شود تا سرویس‌ها در process
+    بدون اجرای مجدد regex به نوع لینک و شناسه آن دسترسی داشته باشند.
+    """
+    return _router.resolve(url) if _router else None
@@ -1,19 +1,32 @@
 # services/soundcloud.py
 import re
 import os
+import asyncio
 import logging
 import time
-import requests
+import datetime
+import aiohttp
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from services.base_service import BaseService
 from core.handlers.user_manager import can_download
 from core.log_forwarder import forward_download_to_log_channel
+from core import kv_store
+from core.utils import MessageRef, upload_file
+from core.rate_limiter import PRIORITY_PROGRESS
 
 logger = logging.getLogger(__name__)
 
 SOUNDCLOUD_URL_PATTERN = re.compile(r"https?://soundcloud\.com/([a-zA-Z0-9_-]+)/([a-zA-Z0-9_-]+)")
+SMALL_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+CLIENT_ID_KEY = 'soundcloud_client_id'
+CLIENT_ID_TTL = 3600
+# زمان‌بند client_id را این مقدار پیش از انقضا تمدید می‌کند
+CLIENT_ID_REFRESH_MARGIN = 900
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+PROGRESS_INTERVAL = 2
 
 class SoundCloudService(BaseService):
     """
@@ -22,35 +35,73 @@ class SoundCloudService(BaseService):
     """
     _client_id = None
     _last_client_id_fetch = 0
-
-    def _get_client_id(self) -> str | None:
-        # This function is now working correctly and remains unchanged.
-        if self._client_id and (time.time() - self._last_client_id_fetch < 3600):
-            return self._client_id
+    _client_id_lock = asyncio.Lock()
+    _refresh_task: asyncio.Task | None = None
+
+    async def warm_up(self):
+        """
+        client_id ذخیره شده در دیتابیس بارگذاری می‌شود و تنها در صورت نبود یا انقضای آن
+        استخراج جدید انجام می‌شود؛ اولین کاربر پس از راه‌اندازی منتظر استخراج نمی‌ماند.
+        """
+        cls = SoundCloudService
+        stored = await kv_store.get_value(CLIENT_ID_KEY)
+        if stored and not cls._client_id:
+            cls._client_id = stored.value
+            cls._last_client_id_fetch = stored.updated_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        await self.refresh_client_id()
+
+    async def _get_client_id(self) -> str | None:
+        """
+        client_id ذخیره شده را بدون تاخیر برمی‌گرداند. اگر منقضی شده باشد، نسخه فعلی استفاده
+        شده و نسخه جدید در پس‌زمینه استخراج می‌شود؛ تنها در نبود هیچ client_id منتظر استخراج می‌ماند.
+        """
+        cls = SoundCloudService
+        if not cls._client_id:
+            return await self.refresh_client_id()
+        if time.time() - cls._last_client_id_fetch >= CLIENT_ID_TTL and not (cls._refresh_task and not cls._refresh_task.done()):
+            cls._refresh_task = asyncio.create_task(self.refresh_client_id())
+        return cls._client_id
+
+    async def refresh_client_id(self, max_age: float = CLIENT_ID_TTL, stale: str | None = None) -> str | None:
+        """
+        اگر عمر client_id فعلی از max_age بیشتر باشد، نسخه جدید استخراج و در دیتابیس ذخیره می‌شود.
+        با stale (کلیدی که توسط API رد شده) استخراج اجباری است، مگر آنکه قبلاً جایگزین شده باشد.
+        در صورت شکست، نسخه قبلی حفظ می‌شود.
+        """
+        cls = SoundCloudService
+        async with cls._client_id_lock:
+            if stale is not None:
+                if cls._client_id != stale:
+                    return cls._client_id
+            elif cls._client_id and time.time() - cls._last_client_id_fetch < max_age:
+                return cls._client_id
+            client_id = await self._scrape_client_id()
+            if client_id:
+                cls._client_id = client_id
+                cls._last_client_id_fetch = time.time()
+                await kv_store.set_value(CLIENT_ID_KEY, client_id)
+            return cls._client_id
+
+    async def _scrape_client_id(self) -> str | None:
         logger.info("Attempting to fetch new SoundCloud client_id...")
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            main_page_res = requests.get("https://soundcloud.com", headers=headers, timeout=10)
-            main_page_res.raise_for_status()
-            script_urls = re.findall(r'<script crossorigin src="(https://a-v2\.sndcdn\.com/assets/[^"]+\.js)"></script>', main_page_res.text)
+            main_page = await self.http.get_text("https://soundcloud.com", headers=HEADERS, timeout=SMALL_REQUEST_TIMEOUT)
+            script_urls = re.findall(r'<script crossorigin src="(https://a-v2\.sndcdn\.com/assets/[^"]+\.js)"></script>', main_page)
             if not script_urls:
                 logger.error("Could not find any JavaScript asset URLs on the SoundCloud homepage.")
                 return None
             for script_url in reversed(script_urls):
                 try:
-                    script_content_res = requests.get(script_url, headers=headers, timeout=10)
-                    script_content_res.raise_for_status()
-                    match = re.search(r',client_id:"([a-zA-Z0-9_]+)"', script_content_res.text)
+                    script_content = await self.http.get_text(script_url, headers=HEADERS, timeout=SMALL_REQUEST_TIMEOUT)
+                    match = re.search(r',client_id:"([a-zA-Z0-9_]+)"', script_content)
                     if match:
-                        self._client_id = match.group(1)
-                        self._last_client_id_fetch = time.time()
-                        logger.info(f"SUCCESS: Extracted client_id '{self._client_id}' from {script_url}")
-                        return self._client_id
-                except requests.RequestException:
+                        logger.info(f"SUCCESS: Extracted client_id '{match.group(1)}' from {script_url}")
+                        return match.group(1)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
                     continue
             logger.error("Searched all JS files but could not find a client_id.")
             return None
-        except requests.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Failed to fetch SoundCloud homepage to get client_id: {e}")
             return None
 
@@ -60,8 +111,63 @@ class SoundCloudService(BaseService):
         bar = '▓' * filled_length + '░' * (bar_length - filled_length)
         return f"**[{bar}]**"
 
-    async def can_handle(self, url: str) -> bool:
-        return re.match(SOUNDCLOUD_URL_PATTERN, url) is not None
+    async def _resolve_stream(self, clean_url: str, client_id: str) -> tuple[dict, str | None, str]:
+        """اطلاعات آهنگ و لینک مستقیم فایل progressive را برمی‌گرداند: (track_data, audio_url, quality)"""
+        resolve_url = f"https://api-v2.soundcloud.com/resolve?url={clean_url}&client_id={client_id}"
+        track_data = await self.http.get_json(resolve_url, headers=HEADERS, timeout=SMALL_REQUEST_TIMEOUT)
+
+        audio_url = None
+        quality = "استاندارد"
+        for transcoding in track_data.get('media', {}).get('transcodings', []):
+            if transcoding.get('format', {}).get('protocol') == 'progressive':
+                stream_api_url = f"{transcoding['url']}?client_id={client_id}"
+                stream_data = await self.http.get_json(stream_api_url, headers=HEADERS, timeout=SMALL_REQUEST_TIMEOUT)
+                audio_url = stream_data.get('url')
+                if "hq" in transcoding.get('quality', ''):
+                    quality = "بالا (HQ)"
+                if audio_url:
+                    break
+        return track_data, audio_url, quality
+
+    async def _stream_to_file(self, audio_url: str, path: str, msg):
+        """فایل را به صورت استریمی روی دیسک می‌نویسد؛ پیشرفت توسط یک task جداگانه با فاصله ثابت گزارش می‌شود."""
+        progress = {'downloaded': 0, 'total': 0}
+        reporter = asyncio.create_task(self._report_progress(msg, progress))
+        try:
+            async with self.http.request('GET', audio_url, headers=HEADERS) as r:
+                r.raise_for_status()
+                progress['total'] = int(r.headers.get('content-length', 0))
+                with open(path, 'wb') as f:
+                    async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        progress['downloaded'] += len(chunk)
+        finally:
+            reporter.cancel()
+
+    async def _report_progress(self, msg, progress: dict):
+        last_text = None
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            total_size = progress['total']
+            if not total_size:
+                continue
+            ratio = progress['downloaded'] / total_size
+            text = (f"**در حال دانلود از سرور...**\n\n"
+                    f"{self._create_progress_bar(ratio)} {ratio:.0%}\n\n"
+                    f"`{progress['downloaded'] / 1024 / 1024:.1f} MB / {total_size / 1024 / 1024:.1f} MB`")
+            if text == last_text:
+                continue
+            try:
+                # ویرایش پیشرفت با اولویت پایین‌تر از پاسخ‌های کاربران (core/rate_limiter.py)
+                await MessageRef(msg.chat_id, msg.message_id).edit(
+                    msg.get_bot(), text, rate_limit_args={'priority': PRIORITY_PROGRESS}
+                )
+                last_text = text
+            except Exception:
+                pass
+
+    HOSTS = ('soundcloud.com',)
+    URL_PATTERNS = (SOUNDCLOUD_URL_PATTERN,)
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         # --- FIX: ADDED DOWNLOAD LIMIT CHECK ---
@@ -71,8 +177,7 @@ class SoundCloudService(BaseService):
 
         msg = await update.message.reply_text("در حال اتصال به API ساندکلاد...")
         
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        client_id = self._get_client_id()
+        client_id = await self._get_client_id()
         if not client_id:
             await msg.edit_text("❌ خطا: امکان دریافت کلید دسترسی از ساندکلاد وجود ندارد.")
             return
@@ -80,10 +185,18 @@ class SoundCloudService(BaseService):
         temp_filename = "" # Define temp_filename to be in scope for finally block
         try:
             clean_url = url.split('?')[0]
-            resolve_url = f"https://api-v2.soundcloud.com/resolve?url={clean_url}&client_id={client_id}"
-            meta_res = requests.get(resolve_url, headers=headers, timeout=10)
-            meta_res.raise_for_status()
-            track_data = meta_res.json()
+            try:
+                track_data, audio_url, quality = await self._resolve_stream(clean_url, client_id)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in (401, 403):
+                    raise
+                # کلید توسط API رد شده است؛ یک بار استخراج مجدد و تلاش دوباره
+                logger.warning(f"SoundCloud rejected client_id ({e.status}), re-scraping once.")
+                rejected_id = client_id
+                client_id = await self.refresh_client_id(stale=rejected_id)
+                if not client_id or client_id == rejected_id:
+                    raise
+                track_data, audio_url, quality = await self._resolve_stream(clean_url, client_id)
 
             track_id = track_data.get('id')
             temp_filename = f"downloads/soundcloud_{track_id}.mp3"
@@ -94,50 +207,14 @@ class SoundCloudService(BaseService):
             duration_ms = track_data.get('duration', 0)
             duration_str = time.strftime('%M:%S', time.gmtime(duration_ms / 1000))
 
-            audio_url = None
-            quality = "استاندارد"
-            for transcoding in track_data.get('media', {}).get('transcodings', []):
-                if transcoding.get('format', {}).get('protocol') == 'progressive':
-                    stream_api_url = f"{transcoding['url']}?client_id={client_id}"
-                    stream_res = requests.get(stream_api_url, headers=headers, timeout=10)
-                    stream_res.raise_for_status()
-                    audio_url = stream_res.json().get('url')
-                    if "hq" in transcoding.get('quality', ''):
-                        quality = "بالا (HQ)"
-                    if audio_url:
-                        break
-            
             if not audio_url:
                 await msg.edit_text("❌ لینک دانلود مستقیم برای این آهنگ یافت نشد.")
                 return
 
             await msg.edit_text("لینک مستقیم پیدا شد! **در حال دانلود از سرور...**")
 
-            with requests.get(audio_url, stream=True, timeout=300) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get('content-length', 0))
-                downloaded_size = 0
-                last_update_time = time.time()
-                
-                with open(temp_filename, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 512):
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        current_time = time.time()
-                        if current_time - last_update_time > 2 and total_size > 0:
-                            progress = downloaded_size / total_size
-                            progress_bar = self._create_progress_bar(progress)
-                            downloaded_mb = downloaded_size / 1024 / 1024
-                            total_mb = total_size / 1024 / 1024
-                            text = (f"**در حال دانلود از سرور...**\n\n"
-                                    f"{progress_bar} {progress:.0%}\n\n"
-                                    f"`{downloaded_mb:.1f} MB / {total_mb:.1f} MB`")
-                            try:
-                                await msg.edit_text(text, parse_mode='Markdown')
-                            except Exception:
-                                pass
-                            last_update_time = current_time
-            
+            await self._stream_to_file(audio_url, temp_filename, msg)
+
             await msg.edit_text("دانلود کامل شد. **در حال آپلود برای شما...** 🚀")
 
             file_size_mb = os.path.getsize(temp_filename) / 1024 / 1024
@@ -149,7 +226,7 @@ class SoundCloudService(BaseService):
                 f"▪️ **مدت زمان:** `{duration_str}`"
             )
 
-            with open(temp_filename, 'rb') as audio_file:
+            with upload_file(temp_filename) as audio_file:
                 sent_message = await context.bot.send_audio(
                     chat_id=update.effective_chat.id,
                     audio=audio_file,
@@ -161,7 +238,7 @@ class SoundCloudService(BaseService):
                     parse_mode='Markdown'
                 )
 
-            await forward_download_to_log_channel(context, user, sent_message, "soundcloud", url)
+            forward_download_to_log_channel(context.bot, user, sent_message, "soundcloud", url)
             await msg.delete()
 
         except Exception as e:
@@ -1,13 +1,16 @@
 # services/spotify.py
 
 import re
+import asyncio
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from core.settings import settings
 from services.base_service import BaseService
+from services.router import route_url
 from core.handlers.user_manager import get_or_create_user, can_download
 from database.database import AsyncSessionLocal
 
@@ -26,30 +29,38 @@ class SpotifyService(BaseService):
             retries=3
         )
 
-    async def can_handle(self, url: str) -> bool:
-        return re.match(SPOTIFY_URL_PATTERN, url) is not None
+    HOSTS = ('open.spotify.com',)
+    URL_PATTERNS = (SPOTIFY_URL_PATTERN,)
+
+    def route_info(self, match: re.Match) -> tuple[str, str]:
+        return match.group(1), match.group(2)
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
             await update.message.reply_text("شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕")
             return
 
-        match = re.match(SPOTIFY_URL_PATTERN, url)
-        link_type, item_id = match.groups()
+        route = route_url(url)
+        link_type, item_id = route.link_type, route.resource_id
 
-        await update.message.delete()
+        # در پیام‌های چند لینکی ممکن است پیام کاربر قبلاً توسط لینک دیگری حذف شده باشد
+        try:
+            await update.message.delete()
+        except BadRequest:
+            pass
         processing_message = await context.bot.send_message(chat_id=update.effective_chat.id, text="در حال پردازش لینک اسپاتیفای... 🕵️")
 
+        loop = asyncio.get_running_loop()
         try:
             if link_type == 'track':
-                track_info = self.sp.track(item_id)
+                track_info = await loop.run_in_executor(None, self.sp.track, item_id)
                 caption, reply_markup = self.build_track_panel(track_info)
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id, photo=track_info['album']['images'][0]['url'],
                     caption=caption, reply_markup=reply_markup, parse_mode='Markdown'
                 )
             elif link_type == 'album':
-                album_info = self.sp.album(item_id)
+                album_info = await loop.run_in_executor(None, self.sp.album, item_id)
                 caption, reply_markup = self.build_album_panel(album_info)
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id, photo=album_info['images'][0]['url'],
@@ -59,7 +70,7 @@ class SpotifyService(BaseService):
                 if user.subscription_tier not in ['gold', 'diamond']:
                      await processing_message.edit_text("برای دانلود پلی‌لیست اسپاتیفay، به اشتراک طلایی یا الماسی نیاز دارید.")
                      return
-                playlist_info = self.sp.playlist(item_id)
+                playlist_info = await loop.run_in_executor(None, self.sp.playlist, item_id)
                 caption, reply_markup = self.build_playlist_panel(playlist_info)
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id, photo=playlist_info['images'][0]['url'],
@@ -67,7 +78,7 @@ class SpotifyService(BaseService):
                 )
             # --- FIX: افزودن منطق برای لینک هنرمند ---
             elif link_type == 'artist':
-                artist_info = self.sp.artist(item_id)
+                artist_info = await loop.run_in_executor(None, self.sp.artist, item_id)
                 caption, reply_markup = self.build_artist_panel(artist_info)
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id, photo=artist_info['images'][0]['url'],
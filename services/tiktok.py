@@ -8,8 +8,9 @@ from core.handlers.user_manager import can_download
 TIKTOK_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?tiktok\.com/(@[a-zA-Z0-9_.-]+)/video/(\d+)")
 
 class TikTokService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(TIKTOK_URL_PATTERN, url) is not None
+    HOSTS = ('tiktok.com',)
+    URL_PATTERNS = (TIKTOK_URL_PATTERN,)
+    PROBE_URL = 'https://www.tiktok.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
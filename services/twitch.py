@@ -8,8 +8,9 @@ from core.handlers.user_manager import can_download
 TWITCH_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?twitch\.tv/(?:videos/(\d+)|clips/([a-zA-Z0-9_-]+)|([a-zA-Z0-9_]+)/clip/([a-zA-Z0-9_-]+))")
 
 class TwitchService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(TWITCH_URL_PATTERN, url) is not None
+    HOSTS = ('twitch.tv',)
+    URL_PATTERNS = (TWITCH_URL_PATTERN,)
+    PROBE_URL = 'https://www.twitch.tv/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         # --- FIX: ADDED DOWNLOAD LIMIT CHECK ---
@@ -10,8 +10,9 @@ from core.handlers.user_manager import can_download
 TWITTER_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?(twitter|x)\.com/([a-zA-Z0-9_]+)/status/(\d+)")
 
 class TwitterService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(TWITTER_URL_PATTERN, url) is not None
+    HOSTS = ('twitter.com', 'x.com')
+    URL_PATTERNS = (TWITTER_URL_PATTERN,)
+    PROBE_URL = 'https://x.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         # --- FIX: ADDED DOWNLOAD LIMIT CHECK ---
@@ -8,8 +8,9 @@ from core.handlers.user_manager import can_download
 VIMEO_URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?vimeo\.com/(\d+)")
 
 class VimeoService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(VIMEO_URL_PATTERN, url) is not None
+    HOSTS = ('vimeo.com',)
+    URL_PATTERNS = (VIMEO_URL_PATTERN,)
+    PROBE_URL = 'https://vimeo.com/robots.txt'
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
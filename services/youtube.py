@@ -1,11 +1,14 @@
 # services/youtube.py
 import re
 import logging
+from typing import Sequence
 import yt_dlp
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from services.base_service import BaseService
+from services.router import route_url
 from core.handlers.user_manager import get_or_create_user, can_download
+from core.result_store import result_store, ResultItem
 
 YOUTUBE_URL_PATTERN = re.compile(
     r"(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/"
@@ -15,18 +18,31 @@ YOUTUBE_URL_PATTERN = re.compile(
     r"(?:c/|channel/|@)[^/\?&]+"  # Channel (all formats)
     r")"
 )
+YOUTUBE_CHANNEL_PATH = re.compile(r"(?:c/|channel/|@)([^/\?&]+)")
 
 class YoutubeService(BaseService):
-    async def can_handle(self, url: str) -> bool:
-        return re.match(YOUTUBE_URL_PATTERN, url) is not None
+    HOSTS = ('youtube.com', 'youtu.be', 'youtube-nocookie.com')
+    URL_PATTERNS = (YOUTUBE_URL_PATTERN,)
+    PROBE_URL = 'https://www.youtube.com/generate_204'
+
+    def route_info(self, match: re.Match) -> tuple[str, str]:
+        path = match.group(5)
+        channel = YOUTUBE_CHANNEL_PATH.match(path)
+        if channel:
+            return 'channel', channel.group(1)
+        if path.startswith('playlist?list='):
+            return 'playlist', path[len('playlist?list='):]
+        # watch?v=ID, embed/ID, shorts/ID یا youtu.be/ID
+        return 'video', path.split('v=')[-1].split('/')[-1]
 
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, url: str):
         if not can_download(user):
             await update.message.reply_text("شما به حد مجاز دانلود روزانه خود رسیده‌اید. 😕")
             return
 
-        is_channel = bool(re.search(r"/(c/|channel/|@)", url))
-        is_playlist = 'playlist?list=' in url
+        route = route_url(url)
+        is_channel = route is not None and route.link_type == 'channel'
+        is_playlist = route is not None and route.link_type == 'playlist'
 
         if is_playlist and user.subscription_tier not in ['gold', 'diamond']:
             await update.message.reply_text("برای دانلود پلی‌لیست، به اشتراک طلایی یا الماسی نیاز دارید.")
@@ -124,20 +140,20 @@ class YoutubeService(BaseService):
             return
 
         channel_name = info.get('uploader', 'کانال یوتیوب')
-        context.bot_data[f"yt_pls_{msg.chat.id}"] = playlists
+        playlists = result_store.put(result_store.make_key('yt_pls', msg.chat.id, msg.message_id), playlists)
         
         text = f"**کانال:** `{channel_name}`\n\nلطفاً پلی‌لیست مورد نظر را برای دانلود انتخاب کنید (صفحه ۱):"
         keyboard = self.build_playlist_keyboard(playlists, chat_id=msg.chat.id, page=1)
         await msg.edit_text(text, reply_markup=keyboard, parse_mode='Markdown')
 
-    def build_playlist_keyboard(self, playlists: list, chat_id: int, page: int = 1, per_page: int = 10) -> InlineKeyboardMarkup:
+    def build_playlist_keyboard(self, playlists: Sequence[ResultItem], chat_id: int, page: int = 1, per_page: int = 10) -> InlineKeyboardMarkup:
         """دکمه‌های صفحه‌بندی شده برای لیست پلی‌لیست‌های کانال را ایجاد می‌کند."""
         start = (page - 1) * per_page
         end = start + per_page
         
         buttons = []
-        for pl in playlists[start:end]:
-            buttons.append([InlineKeyboardButton(f"📁 {pl['title']}", callback_data=f"yt:playlist_zip:{pl['id']}")])
+        for playlist_id, title in playlists[start:end]:
+            buttons.append([InlineKeyboardButton(f"📁 {title}", callback_data=f"yt:playlist_zip:{playlist_id}")])
         
         nav_buttons = []
         if page > 1:
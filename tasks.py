@@ -1,100 +1,102 @@
 # tasks.py
-import os
-import yt_dlp
+"""
+worker دانلود خارج از پردازه ربات (DOWNLOAD_BACKEND=celery).
+اجرا: celery -A tasks worker --concurrency=4
+هر worker همان خط لوله start_actual_download را اجرا می‌کند (کش، yt-dlp، آپلود و ثبت آمار).
+"""
+import time
+import asyncio
+import logging
+
 from celery import Celery
-from telegram import Bot
-from database.database import SessionLocal
-from database.models import FileCache
-from core.user_manager import increment_download_count, log_activity
-from core.settings import settings # <--- وارد کردن از کلاس تنظیمات
+from celery.signals import worker_process_init
+from telegram.ext import ExtBot
 
-# --- Celery and Bot Initialization ---
-celery_app = Celery('tasks', broker='redis://redis:6379/0')
+import config
 
-# Create a Telegram Bot instance to send messages from within the Celery worker.
-bot = Bot(token=settings.BOT_TOKEN)
+from bot.request import build_requests, bot_api_options
+from core.log_forwarder import wait_for_pending_forwards
+from core.rate_limiter import rate_limiter
+from core.settings import settings
+from core.utils import MessageRef
+from database.database import AsyncSessionLocal
+from database.models import User
 
+logger = logging.getLogger(__name__)
 
-# --- Main Download Task ---
-@celery_app.task
-def download_task(user_id, url, quality, service, resource_id):
-    """
-    This Celery task runs in a separate worker process to handle file downloads.
-    It downloads the requested media, sends it to the user, caches the file,
-    updates user stats, and cleans up the downloaded file.
-    """
-    filename = None
-    
-    try:
-        # --- Step 1: Determine the full download URL ---
-        if service == 'yt':
-            download_url = f"https://www.youtube.com/watch?v={resource_id}"
-        elif service == 'sc':
-            download_url = f"https://soundcloud.com/tracks/{resource_id}"
-        else:
-            download_url = url
+# --- Celery Initialization ---
+celery_app = Celery('tasks', broker=settings.CELERY_BROKER_URL)
+celery_app.conf.update(
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,  # هر worker تنها یک دانلود سنگین را در اختیار می‌گیرد
+    broker_transport_options={'priority_steps': list(range(10)), 'queue_order_strategy': 'priority'},
+)
 
-        # --- Step 2: Configure yt-dlp download options ---
-        if quality == 'audio':
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'%(title)s_{resource_id}.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'quiet': True,
-            }
-        else:
-            resolution = quality.split('_')[1]
-            ydl_opts = {
-                'format': f'bestvideo[height<={resolution}]+bestaudio/best[height<={resolution}]',
-                'outtmpl': f'%(title)s_{resource_id}.%(ext)s',
-                'quiet': True,
-            }
-        
-        # --- Step 3: Download the file using yt-dlp ---
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(download_url, download=True)
-            original_filename = ydl.prepare_filename(info)
-            filename = os.path.splitext(original_filename)[0] + '.mp3' if quality == 'audio' else original_filename
+# هر پردازه worker یک حلقه رویداد و یک Bot دائمی دارد تا اتصال‌های دیتابیس و HTTP بین وظایف حفظ شوند
+_loop: asyncio.AbstractEventLoop | None = None
+_bot: ExtBot | None = None
+# اسکن و بازبینی پراکسی‌ها کار نمونه اصلی ربات است؛ worker استخر ذخیره شده آن را دوره‌ای بارگذاری می‌کند
+config.MAINTAIN_PROXIES = False
+PROXY_RELOAD_INTERVAL = 600
+# حداکثر انتظار پایان هر وظیفه برای ارسال‌های کانال لاگ (ثانیه)
+LOG_FORWARD_TIMEOUT = 60
+_proxies_loaded_at = 0.0
 
-        # --- Step 4: Send the file to the user and get its file_id for caching ---
-        with open(filename, 'rb') as file_to_send:
-            if quality == 'audio':
-                sent_message = bot.send_audio(chat_id=user_id, audio=file_to_send, title=info.get('title'))
-                file_id = sent_message.audio.file_id
-                file_type = 'audio'
-                file_size = sent_message.audio.file_size
-            else:
-                sent_message = bot.send_video(chat_id=user_id, video=file_to_send, caption=info.get('title'))
-                file_id = sent_message.video.file_id
-                file_type = 'video'
-                file_size = sent_message.video.file_size
-        
-        # --- Step 5: Save the file info to the cache database ---
-        db = SessionLocal()
-        new_cache_entry = FileCache(
-            original_url=download_url,
-            file_id=file_id,
-            file_type=file_type,
-            file_size=file_size
-        )
-        db.add(new_cache_entry)
-        db.commit()
-        db.close()
-        
-        # --- Step 6: Update user statistics and notify them of success ---
-        increment_download_count(user_id)
-        log_activity(user_id, 'download', details=service)
-        bot.send_message(chat_id=user_id, text="✅ Your download is complete!")
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
 
+async def _get_bot() -> ExtBot:
+    global _bot
+    if _bot is None:
+        # همان استخرهای جدای control/media ربات اصلی؛ worker نیازی به getUpdates ندارد
+        request, _ = build_requests()
+        _bot = ExtBot(token=settings.BOT_TOKEN, request=request, rate_limiter=rate_limiter, **bot_api_options())
+        await _bot.initialize()
+    return _bot
+
+async def _refresh_proxies():
+    """پراکسی‌های تایید شده را در اولین وظیفه و سپس هر PROXY_RELOAD_INTERVAL ثانیه از دیتابیس بارگذاری می‌کند."""
+    global _proxies_loaded_at
+    if _proxies_loaded_at and time.monotonic() - _proxies_loaded_at < PROXY_RELOAD_INTERVAL:
+        return
+    try:
+        await config.load_proxy_health()
     except Exception as e:
-        print(f"Error in download task for user {user_id}: {e}")
-        bot.send_message(chat_id=user_id, text="❌ An unexpected error occurred during your download. Please try again.")
-    
+        logger.warning(f"Could not load persisted proxies: {e}")
+    _proxies_loaded_at = time.monotonic()
+
+async def _run_download(user_id: int, dl_info: dict, message: dict):
+    from core.handlers.download.backends import run_download_job
+
+    await _refresh_proxies()
+
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, user_id)
+    if not user:
+        logger.warning(f"Download task for unknown user {user_id} skipped.")
+        return
+    bot = await _get_bot()
+    try:
+        await run_download_job(bot, user, dl_info, MessageRef.from_dict(message))
     finally:
-        if filename and os.path.exists(filename):
-            os.remove(filename)
-            print(f"Cleaned up file: {filename}")
\ No newline at end of file
+        # ارسال پس‌زمینه به کانال لاگ پیش از توقف حلقه رویداد تمام می‌شود
+        await wait_for_pending_forwards(LOG_FORWARD_TIMEOUT)
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    # پراکسی‌ها پیش از اولین وظیفه در دسترس باشند
+    _get_loop().run_until_complete(_refresh_proxies())
+
+
+# --- Main Download Task ---
+@celery_app.task(name='tasks.download_task')
+def download_task(user_id: int, dl_info: dict, message: dict):
+    """
+    یک درخواست دانلود تایید شده را در پردازه worker اجرا می‌کند.
+    خطاها توسط خود خط لوله به کاربر گزارش می‌شوند.
+    """
+    _get_loop().run_until_complete(_run_download(user_id, dl_info, message))